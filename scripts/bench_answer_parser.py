@@ -0,0 +1,60 @@
+"""
+Micro-benchmark: extract_final_answers / parse_many vs. calling
+extract_final_answer_strict + extract_final_answer_loose back to back.
+
+Builds synthetic long completions (step-by-step arithmetic, with a final
+"#### n" line, a \\boxed{} answer, several "####" lines, or no marker at all),
+checks both paths agree on every text, then times them.
+
+    python scripts/bench_answer_parser.py --n 5000 --steps 60
+"""
+import argparse
+import random
+import time
+
+from src.bench.synthetic import synth_completion
+from src.utils.answer_parser import (
+    extract_final_answer_loose,
+    extract_final_answer_strict,
+    extract_final_answers,
+    parse_many,
+)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=5000)
+    ap.add_argument("--steps", type=int, default=60)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [synth_completion(rng, args.steps) for _ in range(args.n)]
+    avg_chars = sum(map(len, texts)) / len(texts)
+
+    expected = [(extract_final_answer_strict(t), extract_final_answer_loose(t)) for t in texts]
+    got = parse_many(texts)
+    mismatches = [i for i, (e, g) in enumerate(zip(expected, got)) if e != g]
+    if mismatches:
+        i = mismatches[0]
+        raise SystemExit(f"{len(mismatches)} mismatches; first at {i}: expected {expected[i]}, got {got[i]}")
+
+    def best_of(fn):
+        best = float("inf")
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t0)
+        return best
+
+    t_old = best_of(lambda: [(extract_final_answer_strict(t), extract_final_answer_loose(t)) for t in texts])
+    t_new = best_of(lambda: [extract_final_answers(t) for t in texts])
+
+    print(f"texts={len(texts)} avg_chars={avg_chars:.0f} identical=True")
+    print(f"strict+loose:          {1e6 * t_old / len(texts):8.1f} us/text")
+    print(f"extract_final_answers: {1e6 * t_new / len(texts):8.1f} us/text ({t_old / t_new:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
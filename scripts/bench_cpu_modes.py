@@ -0,0 +1,86 @@
+"""
+Compares HFGenerator CPU modes (fp32 / bf16 / int8) on a fixed GSM8K slice:
+weight memory footprint, decode tokens/s, first-try accuracy (loose), and the
+accuracy delta and answer agreement against fp32. Decoding is greedy so the
+modes differ only by numerics.
+
+    python scripts/bench_cpu_modes.py --model Qwen/Qwen2.5-0.5B-Instruct --n 50 --num_threads 8
+"""
+import argparse
+import time
+
+from src.rrr.rrr_infer import build_solve_prompt
+from src.utils.answer_parser import extract_final_answer_strict, extract_final_answers
+from src.utils.dataset import iter_examples
+from src.utils.generator import GenConfig
+from src.utils.hf_generator import HFGenerator
+
+
+def weight_mb(model, torch) -> float:
+    """Bytes held by parameters and buffers; quantized linears hold packed int8 weights instead."""
+    seen, total = set(), 0
+    for m in model.modules():
+        tensors = list(m.parameters(recurse=False)) + list(m.buffers(recurse=False))
+        if isinstance(m, torch.ao.nn.quantized.dynamic.Linear):
+            tensors += [t for t in m._packed_params._weight_bias() if t is not None]
+        for t in tensors:
+            if t.data_ptr() not in seen:  # tied weights count once
+                seen.add(t.data_ptr())
+                total += t.numel() * t.element_size()
+    return total / 2**20
+
+
+def run_mode(args, mode: str, examples) -> dict:
+    gen = HFGenerator(args.model, max_batch_size=args.batch_size, cpu_mode=mode, num_threads=args.num_threads)
+    cfg = GenConfig(max_new_tokens=args.max_new_tokens, temperature=0.0, stop_after_final_answer=True)
+    prompts = [build_solve_prompt(ex["question"]) for ex in examples]
+
+    gen.generate_batch(prompts[:1], GenConfig(max_new_tokens=4, temperature=0.0))  # warm-up
+    t0 = time.perf_counter()
+    outs = gen.generate_batch(prompts, cfg)
+    dt = time.perf_counter() - t0
+
+    preds = [extract_final_answers(text)[1] for text, _ in outs]
+    golds = [extract_final_answer_strict(ex["answer"]) for ex in examples]
+    tokens = sum(meta["gen_tokens"] for _, meta in outs)
+    return {
+        "mode": mode,
+        "weights_mb": weight_mb(gen.model, gen.torch),
+        "tokens_per_s": tokens / dt if dt > 0 else 0.0,
+        "acc": sum(p == g for p, g in zip(preds, golds)) / max(len(examples), 1),
+        "preds": preds,
+        "threads": gen.torch.get_num_threads(),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="Qwen/Qwen2.5-0.5B-Instruct")
+    ap.add_argument("--input", dest="input_jsonl", default="data/processed/gsm8k_train.jsonl")
+    ap.add_argument("--n", type=int, default=50, help="first n examples (a fixed slice)")
+    ap.add_argument("--modes", nargs="+", choices=HFGenerator.CPU_MODES, default=list(HFGenerator.CPU_MODES))
+    ap.add_argument("--max_new_tokens", type=int, default=256)
+    ap.add_argument("--batch_size", type=int, default=8)
+    ap.add_argument("--num_threads", type=int, default=None)
+    args = ap.parse_args()
+
+    examples = [ex for _, ex in iter_examples(args.input_jsonl, args.n)]
+    modes = ["fp32"] + [m for m in args.modes if m != "fp32"]  # fp32 is the reference
+    results = []
+    for mode in modes:
+        print(f"[bench] {mode} ...", flush=True)
+        results.append(run_mode(args, mode, examples))
+
+    ref = results[0]
+    print(f"model={args.model} examples={len(examples)} threads={ref['threads']}")
+    print(f"{'mode':<6} {'weights MB':>10} {'tok/s':>8} {'acc':>6} {'d_acc':>7} {'agree':>6}")
+    for r in results:
+        agree = sum(a == b for a, b in zip(r["preds"], ref["preds"])) / max(len(examples), 1)
+        print(
+            f"{r['mode']:<6} {r['weights_mb']:>10.1f} {r['tokens_per_s']:>8.1f} "
+            f"{r['acc']:>6.3f} {r['acc'] - ref['acc']:>+7.3f} {agree:>6.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
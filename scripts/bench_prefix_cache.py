@@ -0,0 +1,77 @@
+"""
+Prefill time with and without the HFGenerator prefix cache, on CPU.
+
+Times one forward pass over each full solve/retry prompt against a forward pass
+over only the question part, continuing from a copy of the cached header KV.
+
+    python scripts/bench_prefix_cache.py --model Qwen/Qwen2.5-0.5B-Instruct --n 20
+"""
+import argparse
+import copy
+import json
+import statistics
+import time
+
+from src.rrr.rrr_infer import PROMPT_PREFIXES, build_retry_prompt, build_solve_prompt
+from src.utils.hf_generator import HFGenerator
+
+REFLECTION = (
+    "ERROR_TYPE: arithmetic\n"
+    "LIKELY_STEP: 2\n"
+    "FIX_PLAN: Recompute the product before subtracting."
+)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="Qwen/Qwen2.5-0.5B-Instruct")
+    ap.add_argument("--input", dest="input_jsonl", default="data/processed/gsm8k_train.jsonl")
+    ap.add_argument("--n", type=int, default=20)
+    ap.add_argument("--threads", type=int, default=None)
+    args = ap.parse_args()
+
+    gen = HFGenerator(args.model, prefixes=PROMPT_PREFIXES, prefix_cache_size=len(PROMPT_PREFIXES))
+    torch = gen.torch
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    with open(args.input_jsonl, "r", encoding="utf-8") as f:
+        questions = [json.loads(line)["question"] for _, line in zip(range(args.n), f)]
+    prompts = [build_solve_prompt(q) for q in questions] + [build_retry_prompt(q, REFLECTION) for q in questions]
+
+    full_s, cached_s = [], []
+    n_prefix_tokens = n_total_tokens = 0
+    with torch.no_grad():
+        for p in prompts:
+            ids = gen.tokenizer(p)["input_ids"]
+            prefix = gen._match_prefix(p, ids, {})
+            if prefix is None:
+                continue
+            entry = gen._prefix_entry(prefix)
+            n_prefix_tokens += len(entry.ids)
+            n_total_tokens += len(ids)
+
+            x = torch.tensor([ids])
+            t0 = time.perf_counter()
+            gen.model(input_ids=x, use_cache=True)
+            full_s.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            past = copy.deepcopy(entry.past_key_values)
+            gen.model(input_ids=x[:, len(entry.ids):], past_key_values=past, use_cache=True)
+            cached_s.append(time.perf_counter() - t0)
+
+    if not full_s:
+        raise SystemExit("No prompt matched a cacheable prefix.")
+
+    full_ms = 1000 * statistics.mean(full_s)
+    cached_ms = 1000 * statistics.mean(cached_s)
+    print(f"model={args.model} prompts={len(full_s)} threads={torch.get_num_threads()}")
+    print(f"prefix tokens reused: {n_prefix_tokens}/{n_total_tokens} = {n_prefix_tokens/max(n_total_tokens,1):.1%}")
+    print(f"prefill full:   {full_ms:8.2f} ms/prompt")
+    print(f"prefill cached: {cached_ms:8.2f} ms/prompt (incl. KV copy)")
+    print(f"saved:          {full_ms - cached_ms:8.2f} ms/prompt ({full_ms/max(cached_ms,1e-9):.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Checks that PromptAssembler's cached-fragment ids equal tokenizing the full
+prompt, for the solve / reflect / retry prompts (and the rollout and verifier
+prompts) of every example in a dataset file, and compares tokenizer time.
+Exits non-zero on any mismatch.
+
+    python scripts/check_prompt_assembly.py --model Qwen/Qwen2.5-0.5B-Instruct
+"""
+import argparse
+import sys
+import time
+
+from transformers import AutoTokenizer
+
+from src.rrr.rollout import build_prompt
+from src.rrr.rrr_infer import build_reflection_prompt, build_retry_prompt, build_solve_prompt
+from src.step_credit.mistake_locator import build_verify_prompt
+from src.utils.answer_parser import extract_final_answers
+from src.utils.dataset import iter_examples
+from src.utils.prompt_assembly import PromptAssembler
+
+REFLECTION = (
+    "ERROR_TYPE: arithmetic\n"
+    "LIKELY_STEP: 2\n"
+    "FIX_PLAN: Recompute the product before subtracting."
+)
+
+
+def prompts_for(ex: dict):
+    question, answer = ex["question"], ex["answer"]
+    solution = answer.split("####")[0].strip()
+    strict, loose = extract_final_answers(answer)
+    return [
+        build_solve_prompt(question),
+        build_reflection_prompt(question, solution, loose, strict),
+        build_reflection_prompt(question, solution, None, strict),
+        build_retry_prompt(question, REFLECTION),
+        build_prompt(question),
+        build_verify_prompt(question, solution),
+    ]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="Qwen/Qwen2.5-0.5B-Instruct")
+    ap.add_argument("--input", dest="input_jsonl", default="data/processed/gsm8k_train.jsonl")
+    ap.add_argument("--limit", type=int, default=None)
+    args = ap.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model, use_fast=True)
+    assembler = PromptAssembler(tokenizer)
+    if not assembler.enabled:
+        print(f"[check] assembly is disabled for {args.model}; every prompt is tokenized whole")
+
+    prompts = [p for _, ex in iter_examples(args.input_jsonl, args.limit) for p in prompts_for(ex)]
+
+    t0 = time.perf_counter()
+    expected = [tokenizer(p)["input_ids"] for p in prompts]
+    full_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    got = [assembler.encode(p) for p in prompts]
+    assembled_s = time.perf_counter() - t0
+
+    bad = [i for i, (a, b) in enumerate(zip(expected, got)) if a != b]
+    for i in bad[:5]:
+        print(f"[check] MISMATCH on prompt {i}:\n{prompts[i]!r}")
+
+    print(f"[check] {len(prompts)} prompts, {len(bad)} mismatches, {assembler.fallbacks} tokenized whole")
+    print(f"[check] fragment cache: {assembler.hits} hits / {assembler.misses} misses")
+    print(f"[check] tokenizer time: full {full_s:.3f}s, assembled {assembled_s:.3f}s")
+    return 1 if bad else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
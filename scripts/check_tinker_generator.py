@@ -0,0 +1,66 @@
+"""
+Drives TinkerGenerator against the local fake sampling client
+(src/bench/fake_tinker.py): results of generate_batch / generate_samples must
+come back in input order although requests finish out of order, transient
+failures must be retried, and no more than --max_in_flight requests may be
+outstanding. Exits non-zero on any failure.
+
+    python scripts/check_tinker_generator.py --n 64 --max_in_flight 8
+"""
+import argparse
+import sys
+
+from src.bench.fake_tinker import CharTokenizer, FakeSamplingClient, FakeTypes
+from src.utils.generator import GenConfig
+from src.utils.tinker_generator import TinkerGenerator
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=64)
+    ap.add_argument("--max_in_flight", type=int, default=8)
+    ap.add_argument("--fail_every", type=int, default=5, help="every k-th prompt fails once before succeeding")
+    args = ap.parse_args()
+
+    client = FakeSamplingClient(fail_times=1)
+    gen = TinkerGenerator.from_clients(
+        client, CharTokenizer(), FakeTypes, max_in_flight=args.max_in_flight, backoff_s=0.001,
+    )
+    cfg = GenConfig(max_new_tokens=64, temperature=0.0, stop_after_final_answer=True)
+
+    prompts = [
+        f"Problem:\nquestion {i}{' FAIL' if args.fail_every and i % args.fail_every == 0 else ''}\n"
+        for i in range(args.n)
+    ]
+    errors = []
+    outs = gen.generate_batch(prompts, cfg)
+    for i, (p, (text, meta)) in enumerate(zip(prompts, outs)):
+        last = p.rstrip("\n").rsplit("\n", 1)[-1]
+        if not text.startswith(f"echo: {last} [0]"):
+            errors.append(f"prompt {i}: out of order or wrong text {text!r}")
+        if not meta["stopped_early"] or not text.endswith(f"#### {len(last)}"):
+            errors.append(f"prompt {i}: final-answer stop not applied to {text!r}")
+
+    samples = gen.generate_samples(prompts[1], cfg, 3)
+    if [t.split("]")[0][-1] for t, _ in samples] != ["0", "1", "2"]:
+        errors.append(f"generate_samples returned {[t for t, _ in samples]}")
+
+    n_fail = sum("FAIL" in p for p in prompts)
+    if client.failures != n_fail:
+        errors.append(f"expected {n_fail} injected failures, saw {client.failures}")
+    if client.calls != len(prompts) + n_fail + 1:
+        errors.append(f"expected {len(prompts) + n_fail + 1} sample calls (with retries), saw {client.calls}")
+    if client.peak_in_flight > args.max_in_flight:
+        errors.append(f"{client.peak_in_flight} requests in flight, limit {args.max_in_flight}")
+
+    for e in errors[:10]:
+        print(f"[check] {e}")
+    print(
+        f"[check] {len(prompts)} prompts, {client.calls} sample calls, {client.failures} retried failures, "
+        f"peak in flight {client.peak_in_flight}/{args.max_in_flight}, {len(errors)} errors"
+    )
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+"""
+Keeps one generator loaded and serves it to run_rrr_eval.py / run_rollout.py
+(pass them --worker ADDRESS). Stop with Ctrl-C.
+
+    python scripts/gen_worker.py --model Qwen/Qwen2.5-0.5B-Instruct --prefix_cache_size 3
+"""
+import argparse
+from dotenv import load_dotenv
+
+from scripts.run import load_config
+from src.rrr.rrr_infer import PROMPT_PREFIXES
+from src.utils.gen_worker import DEFAULT_ADDRESS, serve
+from src.utils.generator import make_generator
+from src.utils.hf_generator import cpu_kwargs_from_config
+
+load_dotenv()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backend", choices=["hf", "tinker"], default="hf")
+    ap.add_argument("--model", default="Qwen/Qwen2.5-0.5B-Instruct")
+    ap.add_argument("--address", default=DEFAULT_ADDRESS, help="host:port, or a Unix socket path")
+    ap.add_argument("--max_batch_size", type=int, default=8, help="max rows per padded model.generate call (hf)")
+    ap.add_argument("--prefix_cache_size", type=int, default=0, help="cache KV of the fixed prompt headers (hf, 0=off)")
+    ap.add_argument("--cpu_mode", choices=["fp32", "bf16", "int8"], default="fp32", help="weight format without CUDA (hf); int8 = dynamic quantization of linear layers")
+    ap.add_argument("--num_threads", type=int, default=None, help="torch intra-op threads (hf)")
+    ap.add_argument("--draft_model", default=None, help="small same-tokenizer model for assisted generation (hf)")
+    ap.add_argument("--cache_db", default=None, help="SQLite file caching generations across runs")
+    ap.add_argument("--cache_max_entries", type=int, default=100_000)
+    ap.add_argument("--max_in_flight", type=int, default=8, help="concurrent sample requests (tinker)")
+    ap.add_argument("--config", default=None, help="YAML config (e.g. configs/base.yaml); its model.cpu_mode / model.num_threads become the defaults of those flags")
+    pre, _ = ap.parse_known_args()
+    if pre.config:
+        ap.set_defaults(**cpu_kwargs_from_config(load_config(pre.config)))
+    args = ap.parse_args()
+
+    kwargs = {}
+    if args.backend == "hf":
+        kwargs.update(
+            max_batch_size=args.max_batch_size,
+            prefixes=PROMPT_PREFIXES,
+            prefix_cache_size=args.prefix_cache_size,
+            cpu_mode=args.cpu_mode,
+            num_threads=args.num_threads,
+            draft_model=args.draft_model,
+        )
+    else:
+        kwargs.update(max_in_flight=args.max_in_flight)
+
+    gen = make_generator(args.backend, args.model, cache_db=args.cache_db, cache_max_entries=args.cache_max_entries, **kwargs)
+    try:
+        serve(gen, args.address)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.cache_db:
+            gen.close()
+
+
+if __name__ == "__main__":
+    main()
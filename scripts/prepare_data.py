@@ -1,22 +1,40 @@
+import argparse
 from datasets import load_dataset
 import json
+import os
 from pathlib import Path
 
+from src.utils.dataset import index_path, write_indexed
+
 OUT = Path("data/processed")
 OUT.mkdir(parents=True, exist_ok=True)
 
 def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument(
+        "--format",
+        choices=["jsonl", "indexed"],
+        default="jsonl",
+        help="indexed: compact JSONL with precomputed gt_final plus a .idx byte-offset index",
+    )
+    args = ap.parse_args()
+
     ds = load_dataset("gsm8k", "main")
     train = ds["train"]
 
     out_file = OUT / "gsm8k_train.jsonl"
+    records = ({"question": ex["question"], "answer": ex["answer"]} for ex in train)
+
+    if args.format == "indexed":
+        n = write_indexed(records, str(out_file))
+        print(f"Wrote {n} examples to {out_file} (+ index)")
+        return
 
+    # an index left by an earlier --format indexed run would no longer match the file
+    if os.path.exists(index_path(str(out_file))):
+        os.remove(index_path(str(out_file)))
     with open(out_file, "w", encoding="utf-8") as f:
-        for ex in train:
-            record = {
-                "question": ex["question"],
-                "answer": ex["answer"]
-            }
+        for record in records:
             f.write(json.dumps(record) + "\n")
 
     print(f"Wrote {len(train)} examples to {out_file}")
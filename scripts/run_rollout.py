@@ -1,8 +1,54 @@
+import argparse
+
+from scripts.run import load_config
+from src.rrr.dynamic_sampling import DynamicSampling
 from src.rrr.rollout import run_rollouts
+from src.utils import trace
+from src.utils.gen_worker import DEFAULT_ADDRESS
+from src.utils.generator import make_generator
 
 if __name__ == "__main__":
-    run_rollouts(
-        input_jsonl="data/processed/gsm8k_train.jsonl",
-        output_jsonl="results/runs/rollout_hf_test.jsonl",
-        limit=25,
-    )
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--model", default="Qwen/Qwen2.5-0.5B-Instruct")
+    ap.add_argument("--worker", nargs="?", const=DEFAULT_ADDRESS, default=None, metavar="ADDRESS", help="use a running scripts/gen_worker.py (serving --model); ADDRESS defaults to its Unix socket")
+    ap.add_argument("--num_samples", type=int, default=4, help="rollouts per question (train.rollouts_per_prompt)")
+    ap.add_argument("--resume", action="store_true", help="skip questions already in the output and append")
+    ap.add_argument("--fsync_every", type=int, default=50)
+    ap.add_argument("--trace", default=None, help="write a Chrome trace / Perfetto JSON of this run")
+    ap.add_argument("--dynamic_sampling", action="store_true", help="sample groups in waves and cut zero-signal groups short")
+    ap.add_argument("--wave_size", type=int, default=2)
+    ap.add_argument("--decide_after", type=int, default=2, help="drop a group once this many samples agree")
+    ap.add_argument("--groups_per_step", type=int, default=8, help="informative groups per training step (train.batch_size)")
+    ap.add_argument("--config", default=None, help="YAML config (e.g. configs/base.yaml); its train.rollouts_per_prompt / train.batch_size become the defaults of --num_samples / --groups_per_step")
+    pre, _ = ap.parse_known_args()
+    if pre.config:
+        train = load_config(pre.config).get("train", {})
+        defaults = {"num_samples": train.get("rollouts_per_prompt"), "groups_per_step": train.get("batch_size")}
+        ap.set_defaults(**{k: v for k, v in defaults.items() if v is not None})
+    args = ap.parse_args()
+
+    if args.trace:
+        trace.enable()
+    gen = make_generator("worker", args.model, address=args.worker) if args.worker else None
+    dynamic = None
+    if args.dynamic_sampling:
+        dynamic = DynamicSampling(
+            wave_size=args.wave_size,
+            decide_after=args.decide_after,
+            groups_per_step=args.groups_per_step,
+        )
+    try:
+        run_rollouts(
+            input_jsonl="data/processed/gsm8k_train.jsonl",
+            output_jsonl="results/runs/rollout_hf_test.jsonl",
+            limit=25,
+            model_name=args.model,
+            num_samples=args.num_samples,
+            gen=gen,
+            resume=args.resume,
+            fsync_every=args.fsync_every,
+            dynamic=dynamic,
+        )
+    finally:
+        if args.trace:
+            trace.export(args.trace)
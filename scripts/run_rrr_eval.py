@@ -1,8 +1,12 @@
 import argparse
 from dotenv import load_dotenv
 
-from src.rrr.rrr_infer import run_rrr_eval
+from scripts.run import load_config
+from src.rrr.rrr_infer import PROMPT_PREFIXES
+from src.rrr.shard import run_eval_job, run_sharded
+from src.utils.gen_worker import DEFAULT_ADDRESS
 from src.utils.generator import GenConfig
+from src.utils.hf_generator import cpu_kwargs_from_config
 
 # Load environment variables from .env file
 load_dotenv()
@@ -12,9 +16,28 @@ def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--backend", choices=["hf", "tinker"], default="hf")
     ap.add_argument("--model", default="Qwen/Qwen2.5-0.5B-Instruct")
+    ap.add_argument("--worker", nargs="?", const=DEFAULT_ADDRESS, default=None, metavar="ADDRESS", help="use a running scripts/gen_worker.py (serving --model) instead of loading the model here; ADDRESS defaults to its Unix socket")
     ap.add_argument("--limit", type=int, default=5)
     ap.add_argument("--input", dest="input_jsonl", default="data/processed/gsm8k_train.jsonl")
     ap.add_argument("--output", dest="output_jsonl", default="results/runs/rrr_eval.jsonl")
+    ap.add_argument("--num_shards", type=int, default=1)
+    ap.add_argument("--shard_id", type=int, default=None, help="run only this shard; omit to launch all shards and merge")
+    ap.add_argument("--threads_per_shard", type=int, default=None, help="torch/OpenMP threads per shard worker (default: CPU count / num_shards)")
+    ap.add_argument("--trace", default=None, help="write a Chrome trace / Perfetto JSON of this run")
+    ap.add_argument("--resume", action="store_true", help="skip examples already in --output and append")
+    ap.add_argument("--replay_from", default=None, help="reuse first tries from this earlier output; only reflect/retry are generated")
+    ap.add_argument("--fsync_every", type=int, default=50)
+    ap.add_argument("--batch_size", type=int, default=8, help="max ready prompts per generate_batch call, mixed across solve/reflect/retry")
+    ap.add_argument("--max_active", type=int, default=None, help="examples in flight across stages (default 2*batch_size)")
+    ap.add_argument("--max_batch_size", type=int, default=8, help="max rows per padded model.generate call (hf)")
+    ap.add_argument("--prefix_cache_size", type=int, default=0, help="cache KV of the fixed prompt headers (hf, 0=off)")
+    ap.add_argument("--cpu_mode", choices=["fp32", "bf16", "int8"], default="fp32", help="weight format without CUDA (hf); int8 = dynamic quantization of linear layers")
+    ap.add_argument("--num_threads", type=int, default=None, help="torch intra-op threads (hf)")
+    ap.add_argument("--draft_model", default=None, help="small same-tokenizer model for assisted generation (hf)")
+    ap.add_argument("--cache_db", default=None, help="SQLite file caching generations across runs")
+    ap.add_argument("--cache_max_entries", type=int, default=100_000)
+    ap.add_argument("--seed", type=int, default=None, help="pin sampling (required to cache temperature > 0)")
+    ap.add_argument("--max_in_flight", type=int, default=8, help="concurrent sample requests (tinker)")
 
     # Optional decoding knobs
     ap.add_argument("--solve_max_new_tokens", type=int, default=256)
@@ -24,38 +47,83 @@ def main():
     ap.add_argument("--top_p", type=float, default=0.95)
     ap.add_argument("--reflect_temperature", type=float, default=0.3)
     ap.add_argument("--reflect_top_p", type=float, default=0.9)
+    ap.add_argument("--no_early_stop", action="store_true", help="decode to max_new_tokens instead of stopping after the answer / 3 reflection lines")
 
+    ap.add_argument("--config", default=None, help="YAML config (e.g. configs/base.yaml); its model.cpu_mode / model.num_threads become the defaults of those flags")
+    pre, _ = ap.parse_known_args()
+    if pre.config:
+        ap.set_defaults(**cpu_kwargs_from_config(load_config(pre.config)))
     args = ap.parse_args()
 
-    if args.backend == "hf":
-        from src.utils.hf_generator import HFGenerator
-        gen = HFGenerator(args.model)
+    gen_spec = {
+        "backend": args.backend,
+        "model_name": args.model,
+        "cache_db": args.cache_db,
+        "cache_max_entries": args.cache_max_entries,
+    }
+    if args.worker:
+        # the model (and its batching / prefix cache options) live in the worker
+        gen_spec.update(backend="worker", address=args.worker)
+    elif args.backend == "hf":
+        gen_spec.update(
+            max_batch_size=args.max_batch_size,
+            prefixes=PROMPT_PREFIXES,
+            prefix_cache_size=args.prefix_cache_size,
+            cpu_mode=args.cpu_mode,
+            num_threads=args.num_threads,
+            draft_model=args.draft_model,
+        )
     else:
-        from src.utils.tinker_generator import TinkerGenerator
-        gen = TinkerGenerator(args.model)
+        gen_spec.update(max_in_flight=args.max_in_flight)
 
-    run_rrr_eval(
-        gen=gen,
+    eval_kwargs = dict(
         input_jsonl=args.input_jsonl,
         output_jsonl=args.output_jsonl,
         limit=args.limit,
+        batch_size=args.batch_size,
+        max_active=args.max_active,
+        resume=args.resume,
+        replay_from=args.replay_from,
+        fsync_every=args.fsync_every,
         solve_cfg=GenConfig(
             max_new_tokens=args.solve_max_new_tokens,
             temperature=args.temperature,
             top_p=args.top_p,
+            seed=args.seed,
+            stop_after_final_answer=not args.no_early_stop,
         ),
         reflect_cfg=GenConfig(
             max_new_tokens=args.reflect_max_new_tokens,
             temperature=args.reflect_temperature,
             top_p=args.reflect_top_p,
+            seed=args.seed,
+            stop_after_newlines=None if args.no_early_stop else 3,
         ),
         retry_cfg=GenConfig(
             max_new_tokens=args.retry_max_new_tokens,
             temperature=args.temperature,
             top_p=args.top_p,
+            seed=args.seed,
+            stop_after_final_answer=not args.no_early_stop,
         ),
     )
 
+    if args.num_shards > 1 and args.shard_id is None:
+        # launch every shard in a process pool, then merge into --output
+        run_sharded(
+            gen_spec,
+            eval_kwargs,
+            args.num_shards,
+            threads_per_shard=args.threads_per_shard,
+            trace_path=args.trace,
+        )
+    else:
+        run_eval_job(
+            gen_spec,
+            {**eval_kwargs, "num_shards": args.num_shards, "shard_id": args.shard_id or 0},
+            trace_path=args.trace,
+        )
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,164 @@
+import hashlib
+import math
+import random
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.bench.synthetic import synth_step
+from src.rrr.rrr_infer import REFLECTION_HEADER, RETRY_HEADER
+from src.utils.answer_parser import extract_final_answer_strict
+from src.utils.dataset import iter_examples
+from src.utils.generator import GenConfig
+
+_QUESTION_RE = re.compile(r"Problem:\n(.*?)\n\n", re.S)
+
+
+@dataclass
+class LatencyModel:
+    """
+    Simulated wall time of one backend call:
+    base latency drawn from `dist` ("constant" | "uniform" | "lognormal") around
+    `mean_s`, plus `per_token_s` for each token of the longest row in the call.
+    """
+    dist: str = "lognormal"
+    mean_s: float = 0.0
+    sigma: float = 0.5
+    per_token_s: float = 0.0
+
+    def sample(self, rng: random.Random, max_gen_tokens: int) -> float:
+        if self.mean_s <= 0:
+            base = 0.0
+        elif self.dist == "constant":
+            base = self.mean_s
+        elif self.dist == "uniform":
+            base = rng.uniform(0.0, 2.0 * self.mean_s)
+        elif self.dist == "lognormal":
+            # parameterized so the distribution mean equals mean_s
+            base = rng.lognormvariate(0.0, self.sigma) * self.mean_s / math.exp(self.sigma ** 2 / 2)
+        else:
+            raise ValueError(f"Unknown latency dist: {self.dist}")
+        return base + self.per_token_s * max_gen_tokens
+
+
+class FakeGenerator:
+    """
+    Deterministic stand-in for a model backend, for offline load tests.
+
+    Recognizes the RRR solve / reflect / retry prompts (and rollout prompts,
+    which look like solves), looks the question up in `answers`, and answers
+    correctly with probability `p_correct` (solve) or `p_retry_correct` (retry).
+    Output length is roughly `mean_gen_tokens` words. Each output depends only on
+    (seed, cfg.seed, prompt, sample index), never on batch composition. Greedy and
+    seeded calls number their samples from 0, so they repeat like a pinned model;
+    unseeded sampled calls continue a per-prompt sample count, so asking again
+    for the same prompt draws fresh samples.
+
+    Latency follows `latency`; with `sleep=True` the call actually sleeps that
+    long, otherwise it only reports it in meta (pure pipeline-overhead runs).
+    """
+    backend = "fake"
+
+    def __init__(
+        self,
+        answers: Dict[str, str],
+        p_correct: float = 0.6,
+        p_retry_correct: float = 0.4,
+        mean_gen_tokens: int = 120,
+        latency: Optional[LatencyModel] = None,
+        sleep: bool = True,
+        seed: int = 0,
+    ):
+        self.answers = answers
+        self.p_correct = p_correct
+        self.p_retry_correct = p_retry_correct
+        self.mean_gen_tokens = mean_gen_tokens
+        self.latency = latency or LatencyModel()
+        self.sleep = sleep
+        self.seed = seed
+        self.model_name = f"fake-p{p_correct}-r{p_retry_correct}"
+        self.calls = 0
+        self.simulated_s = 0.0
+        self._drawn: Dict[str, int] = {}  # unseeded samples handed out per prompt
+
+    @classmethod
+    def from_jsonl(cls, path: str, **kwargs) -> "FakeGenerator":
+        answers = {}
+        for _, ex in iter_examples(path):
+            answers[ex["question"]] = ex.get("gt_final") or extract_final_answer_strict(ex["answer"])
+        return cls(answers, **kwargs)
+
+    def _rng(self, prompt: str, sample: int, cfg_seed: Optional[int] = None) -> random.Random:
+        digest = hashlib.sha256(f"{self.seed}:{cfg_seed}:{sample}:{prompt}".encode("utf-8")).digest()
+        return random.Random(int.from_bytes(digest[:8], "little"))
+
+    def _complete(self, prompt: str, cfg: GenConfig, sample: int) -> Tuple[str, int]:
+        rng = self._rng(prompt, sample, cfg.seed)
+        n_tokens = max(1, min(cfg.max_new_tokens, int(rng.gauss(self.mean_gen_tokens, self.mean_gen_tokens / 4))))
+
+        if prompt.startswith(REFLECTION_HEADER):
+            lines = [
+                f"ERROR_TYPE: {rng.choice(['arithmetic', 'misread', 'setup'])}",
+                f"LIKELY_STEP: {rng.randint(1, 4)}",
+                "FIX_PLAN: Recompute each quantity before combining them.",
+            ]
+            # models often keep going past the three requested lines
+            lines += [synth_step(rng) for _ in range(rng.randint(0, 3))]
+            return "\n".join(lines), min(n_tokens, 12 * len(lines))
+
+        m = _QUESTION_RE.search(prompt)
+        gt = self.answers.get(m.group(1)) if m else None
+        p = self.p_retry_correct if prompt.startswith(RETRY_HEADER) else self.p_correct
+        if gt is not None and rng.random() < p:
+            final = gt
+        else:
+            final = str(rng.randint(-20, 999))
+
+        steps = []
+        words = 0
+        while words < n_tokens:
+            steps.append(synth_step(rng))
+            words += len(steps[-1].split())
+        return "\n".join(steps) + f"\n#### {final}", n_tokens
+
+    def _sample_ids(self, prompt: str, cfg: GenConfig, n: int) -> range:
+        if cfg.temperature <= 0 or cfg.seed is not None:
+            return range(n)
+        start = self._drawn.get(prompt, 0)
+        self._drawn[prompt] = start + n
+        return range(start, start + n)
+
+    def _call(self, jobs: List[Tuple[str, int]], cfg: GenConfig) -> List[Tuple[str, Dict[str, Any]]]:
+        outs = [self._complete(prompt, cfg, sample) for prompt, sample in jobs]
+        self.calls += 1
+        latency = self.latency.sample(self._rng(jobs[0][0], -self.calls), max(n for _, n in outs))
+        self.simulated_s += latency
+        if self.sleep and latency > 0:
+            time.sleep(latency)
+
+        results = []
+        for (prompt, _), (text, n_tokens) in zip(jobs, outs):
+            meta = {
+                "latency_s": latency,
+                "ttft_s": None,
+                "prompt_tokens": len(prompt.split()),
+                "gen_tokens": n_tokens,
+                "tokens_per_s": n_tokens / latency if latency > 0 else None,
+                "model_name": self.model_name,
+                "backend": self.backend,
+                "batch_size": len(jobs),
+            }
+            results.append((text, meta))
+        return results
+
+    def generate(self, prompt: str, cfg: GenConfig) -> Tuple[str, Dict[str, Any]]:
+        return self.generate_batch([prompt], cfg)[0]
+
+    def generate_batch(self, prompts: List[str], cfg: GenConfig) -> List[Tuple[str, Dict[str, Any]]]:
+        if not prompts:
+            return []
+        return self._call([(p, self._sample_ids(p, cfg, 1)[0]) for p in prompts], cfg)
+
+    def generate_samples(self, prompt: str, cfg: GenConfig, num_samples: int) -> List[Tuple[str, Dict[str, Any]]]:
+        return self._call([(prompt, k) for k in self._sample_ids(prompt, cfg, num_samples)], cfg)
@@ -0,0 +1,105 @@
+"""
+Local stand-in for a Tinker SamplingClient, so TinkerGenerator (via
+TinkerGenerator.from_clients) can be driven offline.
+
+FakeSamplingClient.sample returns a concurrent.futures.Future that resolves
+after a random delay, so requests complete out of submission order. Prompts
+containing `fail_marker` raise ConnectionError from `.result()` on their first
+`fail_times` attempts. The completion echoes the prompt's last line, which lets
+a caller check that results come back in input order.
+"""
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+
+class CharTokenizer:
+    """One token per character; enough of the HF tokenizer interface for PromptAssembler and decode."""
+    def __call__(self, text: str, add_special_tokens: bool = True) -> Dict[str, List[int]]:
+        return {"input_ids": [ord(c) for c in text]}
+
+    def decode(self, ids: List[int]) -> str:
+        return "".join(chr(i) for i in ids)
+
+
+@dataclass
+class _ModelInput:
+    tokens: List[int]
+
+    @classmethod
+    def from_ints(cls, tokens: List[int]) -> "_ModelInput":
+        return cls(list(tokens))
+
+
+@dataclass
+class _SamplingParams:
+    max_tokens: int
+    temperature: float = 0.0
+    top_p: float = 1.0
+    seed: Optional[int] = None
+    stop: Optional[List[str]] = None
+
+
+class FakeTypes:
+    """The parts of tinker.types TinkerGenerator uses."""
+    ModelInput = _ModelInput
+    SamplingParams = _SamplingParams
+
+
+@dataclass
+class _Sequence:
+    tokens: List[int]
+    stop_reason: str
+
+
+@dataclass
+class _Response:
+    sequences: List[_Sequence] = field(default_factory=list)
+
+
+class FakeSamplingClient:
+    def __init__(self, max_delay_s: float = 0.02, fail_marker: str = "FAIL", fail_times: int = 1, seed: int = 0):
+        self.max_delay_s = max_delay_s
+        self.fail_marker = fail_marker
+        self.fail_times = fail_times
+        self._rng = random.Random(seed)
+        self._pool = ThreadPoolExecutor(max_workers=64)
+        self._lock = threading.Lock()
+        self._attempts: Dict[str, int] = {}
+        self.calls = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def sample(self, prompt: _ModelInput, sampling_params: _SamplingParams, num_samples: int = 1) -> Future:
+        text = "".join(chr(t) for t in prompt.tokens)
+        with self._lock:
+            self.calls += 1
+            attempt = self._attempts.get(text, 0)
+            self._attempts[text] = attempt + 1
+            delay = self._rng.uniform(0.0, self.max_delay_s)
+        fail = self.fail_marker in text and attempt < self.fail_times
+        return self._pool.submit(self._run, text, sampling_params, num_samples, delay, fail)
+
+    def _run(self, text: str, params: _SamplingParams, num_samples: int, delay: float, fail: bool) -> _Response:
+        with self._lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            time.sleep(delay)
+            if fail:
+                with self._lock:
+                    self.failures += 1
+                raise ConnectionError(f"fake transient failure for {text[-20:]!r}")
+            last_line = text.rstrip("\n").rsplit("\n", 1)[-1]
+            sequences = []
+            for k in range(num_samples):
+                out = f"echo: {last_line} [{k}]\n#### {len(last_line)}\n"[: params.max_tokens]
+                sequences.append(_Sequence(tokens=[ord(c) for c in out], stop_reason="length"))
+            return _Response(sequences)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
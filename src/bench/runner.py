@@ -0,0 +1,150 @@
+"""
+Offline load test of the RRR pipeline against FakeGenerator.
+
+Cases:
+  rrr_eval      run_rrr_eval over a synthetic GSM8K file
+  rollouts      run_rollouts with 4 samples per prompt
+  answer_parser parse_many over synthetic long completions
+
+Each case reports examples/sec and pipeline overhead per example, i.e. wall
+time minus the simulated generation time. The results are compared with a
+stored baseline and the run fails on a regression beyond `--tolerance`.
+Baselines depend on the machine, so refresh them with --update_baseline when
+the benchmark host changes.
+
+    python scripts/bench.py
+    python scripts/bench.py --update_baseline
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Any, Dict
+
+from src.bench.fake_generator import FakeGenerator, LatencyModel
+from src.bench.synthetic import synth_completion, write_synthetic_gsm8k
+from src.rrr.rollout import run_rollouts
+from src.rrr.rrr_infer import run_rrr_eval
+from src.utils.answer_parser import parse_many
+from src.utils.generator import GenConfig
+
+DEFAULT_BASELINE = "benchmarks/baseline.json"
+
+
+def _case_result(n: int, wall_s: float, simulated_s: float) -> Dict[str, float]:
+    return {
+        "examples": n,
+        "wall_s": wall_s,
+        "examples_per_s": n / wall_s if wall_s > 0 else float("inf"),
+        "overhead_ms_per_example": 1000.0 * max(wall_s - simulated_s, 0.0) / max(n, 1),
+    }
+
+
+def bench_rrr_eval(tmp: str, n: int, latency: LatencyModel) -> Dict[str, float]:
+    data = os.path.join(tmp, "rrr_in.jsonl")
+    write_synthetic_gsm8k(data, n, seed=1)
+    gen = FakeGenerator.from_jsonl(data, latency=latency, seed=1)
+
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_rrr_eval(gen, data, os.path.join(tmp, "rrr_out.jsonl"), limit=n, batch_size=16)
+    return _case_result(n, time.perf_counter() - t0, gen.simulated_s)
+
+
+def bench_rollouts(tmp: str, n: int, latency: LatencyModel) -> Dict[str, float]:
+    data = os.path.join(tmp, "rollout_in.jsonl")
+    write_synthetic_gsm8k(data, n, seed=2)
+    gen = FakeGenerator.from_jsonl(data, latency=latency, seed=2)
+
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        run_rollouts(data, os.path.join(tmp, "rollout_out.jsonl"), limit=n, num_samples=4, gen=gen, gen_cfg=GenConfig())
+    return _case_result(n, time.perf_counter() - t0, gen.simulated_s)
+
+
+def bench_answer_parser(n: int) -> Dict[str, float]:
+    rng = random.Random(3)
+    texts = [synth_completion(rng, 60) for _ in range(n)]
+    t0 = time.perf_counter()
+    parse_many(texts)
+    return _case_result(n, time.perf_counter() - t0, 0.0)
+
+
+def _best(run, repeat: int) -> Dict[str, float]:
+    # fastest of `repeat` runs; the minimum is the least noisy estimate on a shared box
+    return max((run() for _ in range(repeat)), key=lambda r: r["examples_per_s"])
+
+
+def run_all(n: int, latency: LatencyModel, repeat: int = 3) -> Dict[str, Dict[str, float]]:
+    with tempfile.TemporaryDirectory() as tmp:
+        return {
+            "rrr_eval": _best(lambda: bench_rrr_eval(tmp, n, latency), repeat),
+            "rollouts": _best(lambda: bench_rollouts(tmp, n, latency), repeat),
+            "answer_parser": _best(lambda: bench_answer_parser(20 * n), repeat),
+        }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> list:
+    """Regressions as human-readable strings (empty when everything is within tolerance)."""
+    failures = []
+    for case, base in baseline.get("cases", {}).items():
+        cur = results.get(case)
+        if cur is None:
+            failures.append(f"{case}: missing from this run")
+            continue
+        if cur["examples_per_s"] < base["examples_per_s"] * (1.0 - tolerance):
+            failures.append(f"{case}: examples/s {cur['examples_per_s']:.1f} < baseline {base['examples_per_s']:.1f}")
+        # overhead of a few microseconds is noise; only flag it past 0.05 ms/example
+        limit = max(base["overhead_ms_per_example"] * (1.0 + tolerance), 0.05)
+        if cur["overhead_ms_per_example"] > limit:
+            failures.append(
+                f"{case}: overhead {cur['overhead_ms_per_example']:.3f} ms/ex > baseline "
+                f"{base['overhead_ms_per_example']:.3f} ms/ex"
+            )
+    return failures
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--n", type=int, default=400, help="examples per pipeline case")
+    ap.add_argument("--latency_ms", type=float, default=2.0, help="mean simulated latency per backend call")
+    ap.add_argument("--latency_dist", choices=["constant", "uniform", "lognormal"], default="lognormal")
+    ap.add_argument("--repeat", type=int, default=3, help="runs per case; the fastest is reported")
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE)
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown")
+    ap.add_argument("--update_baseline", action="store_true")
+    args = ap.parse_args(argv)
+
+    latency = LatencyModel(dist=args.latency_dist, mean_s=args.latency_ms / 1000.0)
+    results = run_all(args.n, latency, args.repeat)
+
+    for case, r in results.items():
+        print(f"{case:14s} {r['examples_per_s']:10.1f} ex/s   overhead {r['overhead_ms_per_example']:8.3f} ms/ex   ({r['examples']} ex, {r['wall_s']:.2f}s)")
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"n": args.n, "latency_ms": args.latency_ms, "latency_dist": args.latency_dist, "cases": results}, f, indent=2)
+        print(f"Wrote baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update_baseline to record one.")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    if (baseline.get("n"), baseline.get("latency_ms"), baseline.get("latency_dist")) != (args.n, args.latency_ms, args.latency_dist):
+        print("[bench] warning: settings differ from the baseline's; comparison may be meaningless", file=sys.stderr)
+
+    failures = compare(results, baseline, args.tolerance)
+    for msg in failures:
+        print(f"REGRESSION {msg}")
+    if not failures:
+        print("OK: within tolerance of baseline")
+    return 1 if failures else 0
@@ -0,0 +1,66 @@
+"""Synthetic GSM8K-like data for offline benchmarks (no model, no network)."""
+import json
+import random
+from typing import List
+
+_WORDS = "she buys sells each per day total cost dollars apples hours left so then we get".split()
+_NAMES = ["Janet", "Tom", "Aisha", "Carlos", "Mei", "Ravi", "Olga", "Sam"]
+_ITEMS = ["eggs", "apples", "muffins", "pencils", "tickets", "stickers", "books"]
+
+
+def synth_step(rng: random.Random) -> str:
+    a, b = rng.randint(1, 999), rng.randint(1, 99)
+    op = rng.choice(["+", "-", "*", "/"])
+    words = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(4, 14)))
+    val = {"+": a + b, "-": a - b, "*": a * b, "/": round(a / b, 2)}[op]
+    return f"{words.capitalize()}: {a} {op} {b} = {val}."
+
+
+def synth_completion(rng: random.Random, steps: int) -> str:
+    """
+    A long step-by-step completion ending in one of the answer shapes the parser
+    has to handle: final "#### n", "$" and trailing text, \\boxed{}, several
+    "####" lines, a non-numeric "####" line, or no marker at all.
+    """
+    body = "\n".join(synth_step(rng) for _ in range(rng.randint(steps // 2, steps)))
+    ans = rng.choice([str(rng.randint(-50, 5000)), f"{rng.randint(1, 99)}.{rng.randint(0, 99)}", f"{rng.randint(1, 9)}/{rng.randint(2, 9)}"])
+    kind = rng.random()
+    if kind < 0.55:
+        tail = f"\n#### {ans}"
+    elif kind < 0.65:
+        tail = f"\n#### ${ans}\nSo the answer is {ans}. Let me double check: {ans}"
+    elif kind < 0.75:
+        tail = f"\nThe answer is \\boxed{{{ans}}}."
+    elif kind < 0.85:
+        tail = f"\n#### about {ans} dollars\n#### \n\n#### {ans} #### 3"
+    elif kind < 0.9:
+        tail = "\n#### unknown\n" + "no digits in this trailing text. " * rng.randint(1, 40)
+    else:
+        tail = f"\nSo she has {ans} left" + " ." * rng.randint(0, 5)
+    return body + tail
+
+
+def synth_example(rng: random.Random) -> dict:
+    name, item = rng.choice(_NAMES), rng.choice(_ITEMS)
+    a, b, c = rng.randint(2, 60), rng.randint(2, 30), rng.randint(1, 9)
+    question = (
+        f"{name} has {a} {item}. Each day {name} buys {b} more and gives away {c}. "
+        f"How many {item} does {name} have after 3 days?"
+    )
+    total = a + 3 * (b - c)
+    answer = (
+        f"Each day {name} gains {b} - {c} = <<{b}-{c}={b - c}>>{b - c} {item}.\n"
+        f"After 3 days that is 3 * {b - c} = <<3*{b - c}={3 * (b - c)}>>{3 * (b - c)}.\n"
+        f"So {name} has {a} + {3 * (b - c)} = <<{a}+{3 * (b - c)}={total}>>{total}.\n"
+        f"#### {total}"
+    )
+    return {"question": question, "answer": answer}
+
+
+def write_synthetic_gsm8k(path: str, n: int, seed: int = 0) -> List[dict]:
+    rng = random.Random(seed)
+    examples = [synth_example(rng) for _ in range(n)]
+    with open(path, "w", encoding="utf-8") as f:
+        for ex in examples:
+            f.write(json.dumps(ex) + "\n")
+    return examples
@@ -0,0 +1,187 @@
+"""
+Preallocated, array-backed rollout storage for training.
+
+Every rollout is one row: right-padded token ids and logprobs, a scalar reward,
+its group (the prompt it was sampled for, for group-normalized advantages),
+its episode (one first -> reflection -> retry chain) and flags. Advantages and
+RRR's outcome-gated reflection rewards are computed over whole columns, and
+minibatches are slices of the underlying arrays, i.e. views, not copies.
+"""
+from dataclasses import dataclass
+from typing import Iterator, Optional, Sequence
+
+import numpy as np
+
+
+@dataclass
+class RolloutBatch:
+    token_ids: np.ndarray      # [B, T] int32
+    logprobs: np.ndarray       # [B, T] float32
+    mask: np.ndarray           # [B, T] bool
+    lengths: np.ndarray        # [B] int32
+    rewards: np.ndarray        # [B] float32
+    advantages: np.ndarray     # [B] float32
+    group_ids: np.ndarray      # [B] int64
+    episode_ids: np.ndarray    # [B] int64
+    is_reflection: np.ndarray  # [B] bool
+    is_retry: np.ndarray       # [B] bool
+    correct: np.ndarray        # [B] bool
+
+
+class RolloutBuffer:
+    """
+    Holds up to `capacity` rollouts of at most `max_len` tokens. `add` writes
+    one row; `group_advantages` and `gated_reflection_rewards` work on all
+    rows at once; `minibatches` yields views.
+    """
+    def __init__(self, capacity: int, max_len: int, pad_id: int = 0):
+        self.capacity = capacity
+        self.max_len = max_len
+        self.pad_id = pad_id
+        self.n = 0
+
+        self.token_ids = np.full((capacity, max_len), pad_id, dtype=np.int32)
+        self.logprobs = np.zeros((capacity, max_len), dtype=np.float32)
+        self.mask = np.zeros((capacity, max_len), dtype=bool)
+        self.lengths = np.zeros(capacity, dtype=np.int32)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.advantages = np.zeros(capacity, dtype=np.float32)
+        self.group_ids = np.zeros(capacity, dtype=np.int64)
+        self.episode_ids = np.zeros(capacity, dtype=np.int64)
+        self.is_reflection = np.zeros(capacity, dtype=bool)
+        self.is_retry = np.zeros(capacity, dtype=bool)
+        self.correct = np.zeros(capacity, dtype=bool)
+        # reflection rows that leak the final answer (reflection.forbid_answer_in_reflection)
+        self.leaks_answer = np.zeros(capacity, dtype=bool)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def clear(self):
+        # Only the per-token arrays need resetting; row scalars are overwritten by add().
+        self.token_ids[:self.n] = self.pad_id
+        self.logprobs[:self.n] = 0.0
+        self.mask[:self.n] = False
+        self.n = 0
+
+    def add(
+        self,
+        token_ids: Sequence[int],
+        logprobs: Sequence[float],
+        reward: float = 0.0,
+        group_id: int = 0,
+        episode_id: int = 0,
+        is_reflection: bool = False,
+        is_retry: bool = False,
+        correct: bool = False,
+        leaks_answer: bool = False,
+    ) -> int:
+        """Appends one rollout and returns its row."""
+        if self.n >= self.capacity:
+            raise ValueError(f"RolloutBuffer is full ({self.capacity} rows)")
+        k = len(token_ids)
+        if k > self.max_len:
+            raise ValueError(f"rollout has {k} tokens, buffer max_len is {self.max_len}")
+        if len(logprobs) != k:
+            raise ValueError(f"{k} tokens but {len(logprobs)} logprobs")
+
+        row = self.n
+        self.token_ids[row, :k] = token_ids
+        self.logprobs[row, :k] = logprobs
+        self.mask[row, :k] = True
+        self.lengths[row] = k
+        self.rewards[row] = reward
+        self.group_ids[row] = group_id
+        self.episode_ids[row] = episode_id
+        self.is_reflection[row] = is_reflection
+        self.is_retry[row] = is_retry
+        self.correct[row] = correct
+        self.leaks_answer[row] = leaks_answer
+        self.n += 1
+        return row
+
+    def group_advantages(self, normalize_std: bool = True, eps: float = 1e-6) -> np.ndarray:
+        """
+        Advantage = reward minus its group's mean reward, divided by the group's
+        std when `normalize_std`. Groups are given by `group_ids` and need not be
+        contiguous. Single-row and constant-reward groups get 0.
+        """
+        r = self.rewards[:self.n].astype(np.float64)
+        _, inv, counts = np.unique(self.group_ids[:self.n], return_inverse=True, return_counts=True)
+        mean = np.bincount(inv, weights=r) / counts
+        centered = r - mean[inv]
+        adv = centered
+        if normalize_std:
+            std = np.sqrt(np.bincount(inv, weights=centered ** 2) / counts)
+            adv = centered / (std[inv] + eps)
+        self.advantages[:self.n] = adv
+        return self.advantages[:self.n]
+
+    def gated_reflection_rewards(
+        self,
+        success_reward: float = 1.0,
+        failure_reward: float = 0.0,
+        forbid_answer: bool = True,
+    ) -> np.ndarray:
+        """
+        Outcome-gated reflection reward (method.reward.type in configs/rrr.yaml):
+        a reflection earns `success_reward` when the retry of the same episode is
+        correct and `failure_reward` otherwise, or when no retry was recorded.
+        With `forbid_answer`, reflections that leak the answer always get
+        `failure_reward`. Writes the reflection rows of `rewards` and returns it.
+        """
+        n = self.n
+        episodes = self.episode_ids[:n]
+        retry = self.is_retry[:n]
+        refl = self.is_reflection[:n]
+
+        # episode -> "its retry was correct", scattered from retry rows, gathered on reflection rows
+        uniq, inv = np.unique(episodes, return_inverse=True)
+        retry_ok = np.zeros(len(uniq), dtype=bool)
+        retry_ok[inv[retry]] = self.correct[:n][retry]
+        earned = retry_ok[inv]
+        if forbid_answer:
+            earned &= ~self.leaks_answer[:n]
+
+        rewards = self.rewards[:n]
+        rewards[refl] = np.where(earned[refl], success_reward, failure_reward)
+        return rewards
+
+    def batch(self, start: int = 0, stop: Optional[int] = None, trim: bool = True) -> RolloutBatch:
+        """
+        Rows [start, stop) as views. With `trim`, the token axis is cut to the
+        longest rollout in the slice (still a view).
+        """
+        stop = self.n if stop is None else min(stop, self.n)
+        rows = slice(start, stop)
+        width = int(self.lengths[rows].max()) if trim and stop > start else self.max_len
+        return RolloutBatch(
+            token_ids=self.token_ids[rows, :width],
+            logprobs=self.logprobs[rows, :width],
+            mask=self.mask[rows, :width],
+            lengths=self.lengths[rows],
+            rewards=self.rewards[rows],
+            advantages=self.advantages[rows],
+            group_ids=self.group_ids[rows],
+            episode_ids=self.episode_ids[rows],
+            is_reflection=self.is_reflection[rows],
+            is_retry=self.is_retry[rows],
+            correct=self.correct[rows],
+        )
+
+    def minibatches(self, size: int, trim: bool = True) -> Iterator[RolloutBatch]:
+        for start in range(0, self.n, size):
+            yield self.batch(start, start + size, trim=trim)
+
+    def shuffle(self, seed: Optional[int] = None):
+        """
+        Permutes the filled rows in place (one gather per array), so the
+        following `minibatches` are random yet still views.
+        """
+        perm = np.random.default_rng(seed).permutation(self.n)
+        for arr in (
+            self.token_ids, self.logprobs, self.mask, self.lengths, self.rewards, self.advantages,
+            self.group_ids, self.episode_ids, self.is_reflection, self.is_retry, self.correct,
+            self.leaks_answer,
+        ):
+            arr[:self.n] = arr[:self.n][perm]
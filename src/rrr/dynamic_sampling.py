@@ -0,0 +1,104 @@
+"""
+Dynamic sampling: spend the rollout budget on prompt groups that carry signal.
+
+A group whose rollouts are all correct or all wrong has zero group-normalized
+advantage. Instead of drawing all `group_size` samples up front, a group is
+drawn in waves of `wave_size`; once `decide_after` samples agree it is
+dropped as zero-signal, and as soon as a wave shows both outcomes the group is
+completed. The caller keeps pulling fresh prompts until a step has
+`groups_per_step` informative groups.
+
+Dropping after a few agreeing samples is a bet: a group can still turn mixed
+later. `decide_after = group_size` never drops an informative group (and
+saves nothing); smaller values trade a few lost groups for compute.
+"""
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.utils.generator import GenConfig, Generator
+
+
+@dataclass
+class DynamicSampling:
+    wave_size: int = 2
+    decide_after: int = 2
+    groups_per_step: int = 8   # train.batch_size in configs/base.yaml
+    max_steps: Optional[int] = None
+
+
+@dataclass
+class GroupSample:
+    outs: List[Tuple[str, Dict[str, Any]]]
+    correct: List[bool]
+    informative: bool
+    waves: int
+    samples_skipped: int  # of group_size, never drawn
+
+
+def sample_group(
+    gen: Generator,
+    prompt: str,
+    cfg: GenConfig,
+    group_size: int,
+    policy: DynamicSampling,
+    is_correct: Callable[[str], bool],
+) -> GroupSample:
+    outs: List[Tuple[str, Dict[str, Any]]] = []
+    correct: List[bool] = []
+    waves = 0
+    while len(outs) < group_size:
+        mixed = 0 < sum(correct) < len(correct)
+        k = group_size - len(outs) if mixed else min(policy.wave_size, group_size - len(outs))
+        # a pinned seed would redraw the same samples every wave
+        wave_cfg = cfg if cfg.seed is None else replace(cfg, seed=cfg.seed + waves)
+        new = gen.generate_samples(prompt, wave_cfg, k)
+        outs.extend(new)
+        correct.extend(is_correct(text) for text, _ in new)
+        waves += 1
+        if not (0 < sum(correct) < len(correct)) and len(outs) >= policy.decide_after:
+            break
+    return GroupSample(
+        outs=outs,
+        correct=correct,
+        informative=0 < sum(correct) < len(correct),
+        waves=waves,
+        samples_skipped=group_size - len(outs),
+    )
+
+
+@dataclass
+class StepStats:
+    """Per training step: informative groups found, prompts spent, tokens generated / saved."""
+    step: int = 0
+    prompts: int = 0
+    informative: int = 0
+    gen_tokens: int = 0
+    tokens_saved: float = 0.0
+    history: List[Dict[str, Any]] = field(default_factory=list)
+
+    def add(self, group: GroupSample):
+        self.prompts += 1
+        self.informative += int(group.informative)
+        drawn = [meta.get("gen_tokens") or 0 for _, meta in group.outs]
+        self.gen_tokens += sum(drawn)
+        # skipped samples are costed at this group's mean length
+        if group.samples_skipped and drawn:
+            self.tokens_saved += group.samples_skipped * sum(drawn) / len(drawn)
+
+    def end_step(self):
+        row = {
+            "step": self.step,
+            "prompts": self.prompts,
+            "informative_groups": self.informative,
+            "gen_tokens": self.gen_tokens,
+            "gen_tokens_saved_est": round(self.tokens_saved),
+        }
+        self.history.append(row)
+        print(
+            f"[rollout] step {self.step}: {self.informative} informative groups from {self.prompts} prompts, "
+            f"{self.gen_tokens} gen tokens, ~{round(self.tokens_saved)} saved",
+            flush=True,
+        )
+        self.step += 1
+        self.prompts = self.informative = self.gen_tokens = 0
+        self.tokens_saved = 0.0
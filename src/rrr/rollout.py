@@ -1,68 +1,29 @@
-import json
-import time
 from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
 import os
 load_dotenv()
 
+from src.rrr.dynamic_sampling import DynamicSampling, StepStats, sample_group
 from src.utils.answer_parser import extract_final_answer_strict
+from src.utils.dataset import iter_examples
+from src.utils.generator import GenConfig, Generator
+from src.utils.prompt_assembly import AssembledPrompt
+from src.utils.resume import done_keys, load_done_records
+from src.utils.result_sink import open_sink
+from src.utils.trace import span
 
 
 def build_prompt(question: str) -> str:
     # Force the "#### <answer>" format so our parser can extract it.
-    return (
+    return AssembledPrompt([
         "You are a helpful math tutor. Solve the problem step by step.\n"
         "At the end, output the final answer on a single line in the format:\n"
         "#### <number>\n\n"
-        f"Problem:\n{question}\n\n"
-        "Solution:\n"
-    )
-
-
-def make_hf_generator(model_name: str):
-    """
-    Returns a function generate(question)->(text, meta)
-    """
-    from transformers import AutoModelForCausalLM, AutoTokenizer
-    import torch
-
-    tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
-    model = AutoModelForCausalLM.from_pretrained(
-        model_name,
-        torch_dtype=torch.float16 if torch.cuda.is_available() else None,
-        device_map="auto" if torch.cuda.is_available() else None,
-    )
-    model.eval()
-
-    def generate(question: str, max_new_tokens: int = 256, temperature: float = 0.7, top_p: float = 0.95):
-        prompt = build_prompt(question)
-        inputs = tokenizer(prompt, return_tensors="pt")
-
-        if torch.cuda.is_available():
-            inputs = {k: v.to(model.device) for k, v in inputs.items()}
-
-        t0 = time.time()
-        with torch.no_grad():
-            out = model.generate(
-                **inputs,
-                max_new_tokens=max_new_tokens,
-                do_sample=True,
-                temperature=temperature,
-                top_p=top_p,
-                eos_token_id=tokenizer.eos_token_id,
-                pad_token_id=tokenizer.eos_token_id,
-            )
-        dt = time.time() - t0
-
-        text = tokenizer.decode(out[0], skip_special_tokens=True)
-        # Keep only the part after "Solution:" (avoid repeating prompt in logs)
-        if "Solution:\n" in text:
-            text = text.split("Solution:\n", 1)[1].strip()
-
-        meta = {"latency_s": dt, "model_name": model_name}
-        return text, meta
-
-    return generate
+        "Problem:\n",
+        f"{question}\n\n",
+        "Solution:\n",
+    ])
 
 
 def run_rollouts(
@@ -70,45 +31,116 @@ def run_rollouts(
     output_jsonl: str,
     limit: int = 50,
     model_name: str = "Qwen/Qwen2.5-0.5B-Instruct",
+    num_samples: int = 1,
+    gen_cfg: GenConfig = GenConfig(max_new_tokens=256, temperature=0.7, top_p=0.95),
+    gen: Optional[Generator] = None,
+    resume: bool = False,
+    fsync_every: int = 50,
+    dynamic: Optional[DynamicSampling] = None,
 ):
     """
-    Loads GSM8K JSONL (question + answer), generates a solution, parses final answer,
-    compares to ground truth, and writes rollouts JSONL.
+    Loads GSM8K JSONL (question + answer), samples `num_samples` solutions per question
+    from one generation call, parses final answers, compares to ground truth, and writes
+    one rollout group per question to JSONL.
+
+    `resume` / `fsync_every` behave as in run_rrr_eval: finished questions are skipped
+    and the counters are rebuilt from the existing output. As there, a ".parquet"
+    output path writes columnar part files.
+
+    With `dynamic`, groups are drawn in waves and zero-signal groups (all correct
+    or all wrong) are cut short, see src/rrr/dynamic_sampling.py. Every group is
+    still written, with "informative" and "waves" fields; a step ends once it has
+    `dynamic.groups_per_step` informative groups, and its generation tokens
+    (spent and saved) are logged.
     """
-    gen = make_hf_generator(model_name)
+    if gen is None:
+        from src.utils.hf_generator import HFGenerator
+        gen = HFGenerator(model_name)
 
     out_path = Path(output_jsonl)
     out_path.parent.mkdir(parents=True, exist_ok=True)
 
     n = 0
+    n_samples = 0
     n_correct = 0
+    n_any_correct = 0
 
-    with open(input_jsonl, "r", encoding="utf-8") as f_in, open(out_path, "w", encoding="utf-8") as f_out:
-        for i, line in enumerate(f_in):
-            if i >= limit:
-                break
-
-            ex = json.loads(line)
+    done = set()
+    if resume:
+        prev = load_done_records(str(out_path))
+        for rec in prev:
+            n += 1
+            n_samples += len(rec["samples"])
+            n_correct += rec["n_correct"]
+            n_any_correct += int(rec["n_correct"] > 0)
+        done = done_keys(prev)
+        print(f"[rollout] resuming: {len(prev)} groups already in {out_path}", flush=True)
+
+    step_stats = StepStats()
+    with open_sink(str(out_path), append=resume, fsync_every=fsync_every) as sink:
+        for i, ex in iter_examples(input_jsonl, limit):
             question = ex["question"]
-            gt_solution = ex["answer"]
-            gt_final = extract_final_answer_strict(gt_solution)
+            if "gt_final" in ex:
+                gt_final = ex["gt_final"]
+            else:
+                gt_solution = ex["answer"]
+                gt_final = extract_final_answer_strict(gt_solution)
+            if i in done or question in done:
+                continue
+
+            if dynamic is not None and dynamic.max_steps is not None and step_stats.step >= dynamic.max_steps:
+                break
 
-            model_solution, meta = gen(question)
-            pred_final = extract_final_answer_strict(model_solution)
+            with span("rollout.generate", idx=i, num_samples=num_samples):
+                if dynamic is None:
+                    outs = gen.generate_samples(build_prompt(question), gen_cfg, num_samples)
+                else:
+                    group = sample_group(
+                        gen, build_prompt(question), gen_cfg, num_samples, dynamic,
+                        is_correct=lambda text: extract_final_answer_strict(text) == gt_final,
+                    )
+                    outs = group.outs
+
+            samples = []
+            with span("rollout.parse"):
+                for model_solution, _ in outs:
+                    pred_final = extract_final_answer_strict(model_solution)
+                    samples.append({
+                        "pred_final": pred_final,
+                        "correct": pred_final == gt_final,
+                        "model_solution": model_solution,
+                    })
+            group_correct = sum(s["correct"] for s in samples)
 
-            correct = (pred_final == gt_final)
             n += 1
-            n_correct += int(correct)
+            n_samples += len(samples)
+            n_correct += group_correct
+            n_any_correct += int(group_correct > 0)
 
             record = {
+                "idx": i,
                 "question": question,
                 "gt_final": gt_final,
-                "pred_final": pred_final,
-                "correct": correct,
-                "model_solution": model_solution,
-                "meta": meta,
+                "n_correct": group_correct,
+                "samples": samples,
+                # one prefill per group, so latency/model info is shared by all samples
+                "meta": outs[0][1],
             }
-            f_out.write(json.dumps(record, ensure_ascii=False) + "\n")
-
-    print(f"Wrote {n} rollouts to {out_path}")
-    print(f"Accuracy (parsed final answers): {n_correct}/{n} = {n_correct/max(n,1):.3f}")
+            if dynamic is not None:
+                record["informative"] = group.informative
+                record["waves"] = group.waves
+                step_stats.add(group)
+                if step_stats.informative >= dynamic.groups_per_step:
+                    step_stats.end_step()
+            with span("rollout.write"):
+                sink.write(record)
+
+    print(f"Wrote {n} rollout groups ({n_samples} samples) to {out_path}")
+    print(f"Accuracy (parsed final answers): {n_correct}/{n_samples} = {n_correct/max(n_samples,1):.3f}")
+    print(f"Groups with >=1 correct: {n_any_correct}/{n} = {n_any_correct/max(n,1):.3f}")
+    if dynamic is not None:
+        if step_stats.prompts:
+            step_stats.end_step()  # partial last step
+        saved = sum(row["gen_tokens_saved_est"] for row in step_stats.history)
+        spent = sum(row["gen_tokens"] for row in step_stats.history)
+        print(f"Dynamic sampling: {spent} gen tokens spent, ~{saved} saved over {len(step_stats.history)} steps")
@@ -1,23 +1,59 @@
 import os
-import json
+from collections import Counter
 from dataclasses import dataclass
-from typing import Optional
+from typing import Dict, Iterator, Optional, Tuple
 
-from src.utils.answer_parser import extract_final_answer_strict, extract_final_answer_loose
+from src.rrr.scheduler import StageScheduler
+from src.utils.answer_parser import extract_final_answer_strict, extract_final_answers
+from src.utils.dataset import iter_examples
 from src.utils.generator import GenConfig, Generator
+from src.utils.metrics import RunMetrics, summary_path
+from src.utils.prompt_assembly import AssembledPrompt
+from src.utils.resume import done_keys, load_done_records
+from src.utils.result_sink import open_sink, read_records
+from src.utils.trace import span
+
+
+# Fixed instruction blocks that open each prompt. They are kept as module constants so
+# backends can cache their prefill once (see HFGenerator's prefix cache).
+SOLVE_HEADER = (
+    "You are a helpful math tutor. Solve the problem step by step.\n"
+    "IMPORTANT:\n"
+    "- The FINAL line of your output must be exactly: #### <answer>\n"
+    "- Do NOT write '####' anywhere except the final line.\n"
+    "- Do not output \\boxed{}.\n"
+    "- Do not add any text after the final line.\n\n"
+)
+
+REFLECTION_HEADER = (
+    "You are analyzing a failed math solution to improve the next attempt.\n"
+    "DO NOT include the correct final answer or any numeric final answer.\n"
+    "Output exactly 3 lines in this format:\n"
+    "ERROR_TYPE: <short>\n"
+    "LIKELY_STEP: <step number or 'unknown'>\n"
+    "FIX_PLAN: <one sentence>\n\n"
+)
+
+RETRY_HEADER = (
+    "You are a helpful math tutor. Use the reflection to solve correctly.\n"
+    "IMPORTANT:\n"
+    "- The FINAL line of your output must be exactly: #### <answer>\n"
+    "- Do NOT write '####' anywhere except the final line.\n"
+    "- Do not output \\boxed{}.\n"
+    "- Do not add any text after the final line.\n\n"
+)
+
+PROMPT_PREFIXES = (SOLVE_HEADER, REFLECTION_HEADER, RETRY_HEADER)
 
 
 def build_solve_prompt(question: str) -> str:
-    return (
-        "You are a helpful math tutor. Solve the problem step by step.\n"
-        "IMPORTANT:\n"
-        "- The FINAL line of your output must be exactly: #### <answer>\n"
-        "- Do NOT write '####' anywhere except the final line.\n"
-        "- Do not output \\boxed{}.\n"
-        "- Do not add any text after the final line.\n\n"
-        f"Problem:\n{question}\n\n"
-        "Solution (end with the final line):\n"
-    )
+    # Fragments split where tokenizers split words, so each can be tokenized once
+    # and reused (see src/utils/prompt_assembly.py); the text is unchanged.
+    return AssembledPrompt([
+        SOLVE_HEADER + "Problem:\n",
+        f"{question}\n\n",
+        "Solution (end with the final line):\n",
+    ])
 
 
 def build_reflection_prompt(
@@ -26,32 +62,26 @@ def build_reflection_prompt(
     pred_final: Optional[str],
     gt_final: str,
 ) -> str:
-    return (
-        "You are analyzing a failed math solution to improve the next attempt.\n"
-        "DO NOT include the correct final answer or any numeric final answer.\n"
-        "Output exactly 3 lines in this format:\n"
-        "ERROR_TYPE: <short>\n"
-        "LIKELY_STEP: <step number or 'unknown'>\n"
-        "FIX_PLAN: <one sentence>\n\n"
-        f"Problem:\n{question}\n\n"
-        f"Model's previous solution:\n{solution}\n\n"
-        f"Model's parsed final answer: {pred_final}\n"
-        f"Correct final answer: {gt_final}\n"
-    )
+    return AssembledPrompt([
+        REFLECTION_HEADER + "Problem:\n",
+        f"{question}\n\n",
+        "Model's previous solution:\n",
+        f"{solution}\n\n",
+        "Model's parsed final answer:",
+        f" {pred_final}\n",
+        "Correct final answer:",
+        f" {gt_final}\n",
+    ])
 
 
 def build_retry_prompt(question: str, reflection: str) -> str:
-    return (
-        "You are a helpful math tutor. Use the reflection to solve correctly.\n"
-        "IMPORTANT:\n"
-        "- The FINAL line of your output must be exactly: #### <answer>\n"
-        "- Do NOT write '####' anywhere except the final line.\n"
-        "- Do not output \\boxed{}.\n"
-        "- Do not add any text after the final line.\n\n"
-        f"Reflection:\n{reflection}\n\n"
-        f"Problem:\n{question}\n\n"
-        "Solution (end with the final line):\n"
-    )
+    return AssembledPrompt([
+        RETRY_HEADER + "Reflection:\n",
+        f"{reflection}\n\n",
+        "Problem:\n",
+        f"{question}\n\n",
+        "Solution (end with the final line):\n",
+    ])
 
 
 def _first_3_lines(text: str) -> str:
@@ -59,111 +89,266 @@ def _first_3_lines(text: str) -> str:
     return "\n".join(lines[:3]).strip()
 
 
-def run_rrr_eval(
-    gen: Generator,
-    input_jsonl: str,
-    output_jsonl: str,
-    limit: int = 50,
-    solve_cfg: GenConfig = GenConfig(max_new_tokens=256, temperature=0.7, top_p=0.95),
-    reflect_cfg: GenConfig = GenConfig(max_new_tokens=128, temperature=0.3, top_p=0.9),
-    retry_cfg: GenConfig = GenConfig(max_new_tokens=256, temperature=0.7, top_p=0.95),
-):
-    os.makedirs(os.path.dirname(output_jsonl), exist_ok=True)
-
-    n = 0
+@dataclass
+class RRRStats:
+    n: int = 0
 
     # We'll report "loose" accuracy as primary (more realistic),
     # and keep "strict" as an ablation metric.
-    first_correct_loose = 0
-    first_correct_strict = 0
+    first_correct_loose: int = 0
+    first_correct_strict: int = 0
 
-    retry_correct_loose = 0
-    retry_correct_strict = 0
-    retries_attempted = 0
+    retry_correct_loose: int = 0
+    retry_correct_strict: int = 0
+    retries_attempted: int = 0
 
-    with open(input_jsonl, "r", encoding="utf-8") as f_in, open(output_jsonl, "w", encoding="utf-8") as f_out:
-        for i, line in enumerate(f_in):
-            if i >= limit:
-                break
+    def add(self, rec: dict):
+        self.n += 1
+        self.first_correct_strict += int(rec["first"]["correct_strict"])
+        self.first_correct_loose += int(rec["first"]["correct_loose"])
+        if rec["retry"] is not None:
+            self.retries_attempted += 1
+            self.retry_correct_strict += int(rec["retry"]["correct_strict"])
+            self.retry_correct_loose += int(rec["retry"]["correct_loose"])
+
+    def report(self, output_jsonl: str):
+        n = self.n
+        first_correct_loose, first_correct_strict = self.first_correct_loose, self.first_correct_strict
+        retry_correct_loose, retry_correct_strict = self.retry_correct_loose, self.retry_correct_strict
+        retries_attempted = self.retries_attempted
+
+        print(f"Wrote {n} examples to {output_jsonl}")
+        print(f"First-try accuracy (loose):  {first_correct_loose}/{n} = {first_correct_loose/max(n,1):.3f}")
+        print(f"First-try accuracy (strict): {first_correct_strict}/{n} = {first_correct_strict/max(n,1):.3f}")
+        if retries_attempted:
+            print(f"Retry success (loose | conditional):  {retry_correct_loose}/{retries_attempted} = {retry_correct_loose/max(retries_attempted,1):.3f}")
+            print(f"Retry success (strict| conditional): {retry_correct_strict}/{retries_attempted} = {retry_correct_strict/max(retries_attempted,1):.3f}")
+            print(f"Overall accuracy (loose):  {(first_correct_loose+retry_correct_loose)}/{n} = {(first_correct_loose+retry_correct_loose)/max(n,1):.3f}")
+            print(f"Overall accuracy (strict): {(first_correct_strict+retry_correct_strict)}/{n} = {(first_correct_strict+retry_correct_strict)/max(n,1):.3f}")
 
-            ex = json.loads(line)
-            q = ex["question"]
-            gt_sol = ex["answer"]
-            gt_final = extract_final_answer_strict(gt_sol)  # GSM8K answers have #### in the gold
-            if gt_final is None:
-                # skip weird example
-                continue
 
-            print(f"[RRR] Example {i+1}/{limit}", flush=True)
+def _score(solution: str, gt_final: str, meta: dict) -> dict:
+    with span("rrr.parse"):
+        pred_strict, pred_loose = extract_final_answers(solution)
+    return {
+        "solution": solution,
+        "pred_final_strict": pred_strict,
+        "pred_final_loose": pred_loose,
+        "correct_strict": pred_strict == gt_final,
+        "correct_loose": pred_loose == gt_final,
+        "meta": meta,
+    }
 
-            # 1) Solve
-            sol1, meta1 = gen.generate(build_solve_prompt(q), solve_cfg)
 
-            pred1_strict = extract_final_answer_strict(sol1)
-            pred1_loose = extract_final_answer_loose(sol1)
+def _iter_examples(
+    input_jsonl: str,
+    limit: int,
+    done: set,
+    num_shards: int = 1,
+    shard_id: int = 0,
+) -> Iterator[Tuple[int, str, str]]:
+    """
+    Yields (idx, question, gt_final) for the first `limit` input examples, minus
+    skipped/done ones and those belonging to other shards (idx % num_shards).
+    """
+    for i, ex in iter_examples(input_jsonl, limit):
+        if i % num_shards != shard_id:
+            continue
+        q = ex["question"]
+        if "gt_final" in ex:
+            gt_final = ex["gt_final"]  # precomputed by prepare_data --format indexed
+        else:
+            gt_final = extract_final_answer_strict(ex["answer"])  # GSM8K answers have #### in the gold
+        if gt_final is None:
+            # skip weird example
+            continue
+        if i in done or q in done:
+            continue
+        yield i, q, gt_final
+
+
+def load_replay(path: str) -> Dict[object, dict]:
+    """`first` blocks of an earlier run's records, keyed like resume.done_keys (idx, else question)."""
+    replay = {}
+    for rec in read_records(path):
+        replay[rec["idx"] if "idx" in rec else rec["question"]] = {"question": rec["question"], "first": rec["first"]}
+    return replay
+
+
+def _submit_reflection(sched: StageScheduler, key: int, rec: dict) -> bool:
+    """Queues the reflection for a wrong first try; False if the first try was right."""
+    # Decide whether to reflect+retry based on LOOSE correctness (practical)
+    if rec["first"]["correct_loose"]:
+        return False
+    prompt = build_reflection_prompt(
+        rec["question"],
+        rec["first"]["solution"],
+        rec["first"]["pred_final_loose"],
+        rec["gt_final"],
+    )
+    sched.submit(key, "reflect", prompt)
+    return True
 
-            ok1_strict = (pred1_strict == gt_final)
-            ok1_loose = (pred1_loose == gt_final)
 
-            first_correct_strict += int(ok1_strict)
-            first_correct_loose += int(ok1_loose)
+def _run_pipelined(
+    gen: Generator,
+    examples: Iterator[Tuple[int, str, str]],
+    solve_cfg: GenConfig,
+    reflect_cfg: GenConfig,
+    retry_cfg: GenConfig,
+    batch_size: int,
+    max_active: int,
+    metrics: Optional[RunMetrics] = None,
+    replay: Optional[Dict[object, dict]] = None,
+) -> Iterator[dict]:
+    """
+    Drives examples through solve -> (reflect -> retry if wrong) with a StageScheduler,
+    keeping up to `max_active` examples in flight. Records are yielded as they complete.
+    Examples found in `replay` (see load_replay) take that first try and skip solve.
+    """
+    sched = StageScheduler(
+        gen,
+        {"solve": solve_cfg, "reflect": reflect_cfg, "retry": retry_cfg},
+        batch_size=batch_size,
+    )
+    active: Dict[int, dict] = {}
+    n_done = 0
 
-            rec = {
+    while True:
+        # Admit new examples as earlier ones finish.
+        while len(active) < max_active:
+            with span("rrr.load"):
+                nxt = next(examples, None)
+            if nxt is None:
+                break
+            idx, q, gt_final = nxt
+            active[idx] = {
+                "idx": idx,
                 "question": q,
                 "gt_final": gt_final,
-                "first": {
-                    "solution": sol1,
-                    "pred_final_strict": pred1_strict,
-                    "pred_final_loose": pred1_loose,
-                    "correct_strict": ok1_strict,
-                    "correct_loose": ok1_loose,
-                    "meta": meta1,
-                },
+                "first": None,
                 "reflection": None,
                 "retry": None,
             }
+            prev = replay.get(idx, replay.get(q)) if replay else None
+            if prev is None:
+                sched.submit(idx, "solve", build_solve_prompt(q))
+                continue
+            if prev["question"] != q:
+                raise ValueError(f"replayed record for idx={idx} has a different question; was it run on another input file?")
+            active[idx]["first"] = prev["first"]
+            if not _submit_reflection(sched, idx, active[idx]):
+                n_done += 1
+                yield active.pop(idx)
+
+        with span("rrr.step", pending=sched.pending()):
+            results = sched.step()
+        if not results:
+            break
+
+        stages = Counter(job.stage for job, _ in results)
+        print(f"[RRR] batch: {', '.join(f'{k}={v}' for k, v in stages.items())} | done {n_done}", flush=True)
+        if metrics is not None:
+            # a mixed batch's wall time is split across its stages by row count
+            for stage, count in stages.items():
+                metas = [meta for job, (_, meta) in results if job.stage == stage]
+                metrics.add_batch(stage, sched.last_batch_s * count / len(results), metas)
+
+        for job, (text, meta) in results:
+            rec = active[job.key]
+            if job.stage == "solve":
+                rec["first"] = _score(text, rec["gt_final"], meta)
+                if _submit_reflection(sched, job.key, rec):
+                    continue
+            elif job.stage == "reflect":
+                rec["reflection"] = {"text": _first_3_lines(text), "meta": meta}
+                sched.submit(job.key, "retry", build_retry_prompt(rec["question"], rec["reflection"]["text"]))
+                continue
+            else:
+                rec["retry"] = _score(text, rec["gt_final"], meta)
+
+            n_done += 1
+            yield active.pop(job.key)
+
+
+def run_rrr_eval(
+    gen: Generator,
+    input_jsonl: str,
+    output_jsonl: str,
+    limit: int = 50,
+    solve_cfg: GenConfig = GenConfig(max_new_tokens=256, temperature=0.7, top_p=0.95, stop_after_final_answer=True),
+    reflect_cfg: GenConfig = GenConfig(max_new_tokens=128, temperature=0.3, top_p=0.9, stop_after_newlines=3),
+    retry_cfg: GenConfig = GenConfig(max_new_tokens=256, temperature=0.7, top_p=0.95, stop_after_final_answer=True),
+    batch_size: int = 8,
+    resume: bool = False,
+    fsync_every: int = 50,
+    max_active: Optional[int] = None,
+    num_shards: int = 1,
+    shard_id: int = 0,
+    replay_from: Optional[str] = None,
+):
+    """
+    Solve, reflect and retry run as queues over a window of `max_active` examples
+    (default 2 * batch_size); each generate_batch call takes up to `batch_size`
+    ready prompts across examples and stages (see StageScheduler).
+
+    With `resume=True`, examples already present in `output_jsonl` (matched by
+    input line index) are skipped and the accuracy counters are rebuilt from
+    those records. The output is fsynced every `fsync_every` records, which
+    bounds how much finished work a crash can lose. Records are written by a
+    background sink; an output path ending in ".parquet" gets columnar part
+    files instead of JSONL (see src/utils/result_sink.py).
+
+    `num_shards`/`shard_id` restrict the run to input lines with
+    idx % num_shards == shard_id (see src/rrr/shard.py to run and merge all shards).
+
+    `replay_from` names an earlier rrr_eval output: its `first` blocks (solution,
+    parsed answers, correctness) are reused as-is and only reflect and retry run
+    for the wrong ones, e.g. to compare reflection prompts or decoding settings
+    without re-solving. Examples missing from it are solved as usual.
+
+    The default configs stop solve/retry once the "#### <answer>" line is done and
+    the reflection after its 3 lines, since nothing past those is used.
+
+    Returns the RunMetrics of this invocation (also written next to the output).
+    """
+    if not 0 <= shard_id < num_shards:
+        raise ValueError(f"shard_id must be in [0, {num_shards}), got {shard_id}")
+    os.makedirs(os.path.dirname(output_jsonl), exist_ok=True)
+
+    stats = RRRStats()
+    metrics = RunMetrics()
+    done = set()
+    if resume:
+        prev = load_done_records(output_jsonl)
+        for rec in prev:
+            stats.add(rec)
+        done = done_keys(prev)
+        print(f"[RRR] resuming: {len(prev)} examples already in {output_jsonl}", flush=True)
+    replay = None
+    if replay_from:
+        replay = load_replay(replay_from)
+        print(f"[RRR] replaying first tries of {len(replay)} examples from {replay_from}", flush=True)
+
+    with open_sink(output_jsonl, append=resume, fsync_every=fsync_every) as sink:
+        examples = _iter_examples(input_jsonl, limit, done, num_shards, shard_id)
+        recs = _run_pipelined(
+            gen, examples, solve_cfg, reflect_cfg, retry_cfg,
+            batch_size=batch_size,
+            max_active=max_active or 2 * batch_size,
+            metrics=metrics,
+            replay=replay,
+        )
+        # Records are written in completion order; "idx" ties each back to its input line.
+        for rec in recs:
+            with span("rrr.write"):
+                sink.write(rec)
+                stats.add(rec)
+
+    stats.report(output_jsonl)
 
-            # Decide whether to reflect+retry based on LOOSE correctness (practical)
-            if not ok1_loose:
-                retries_attempted += 1
-                print("[RRR]  ↳ wrong (loose), reflecting", flush=True)
-
-                refl_text, meta_r = gen.generate(
-                    build_reflection_prompt(q, sol1, pred1_loose, gt_final),
-                    reflect_cfg,
-                )
-                refl_text = _first_3_lines(refl_text)
-
-                print("[RRR]  ↳ retrying", flush=True)
-                sol2, meta2 = gen.generate(build_retry_prompt(q, refl_text), retry_cfg)
-
-                pred2_strict = extract_final_answer_strict(sol2)
-                pred2_loose = extract_final_answer_loose(sol2)
-
-                ok2_strict = (pred2_strict == gt_final)
-                ok2_loose = (pred2_loose == gt_final)
-
-                retry_correct_strict += int(ok2_strict)
-                retry_correct_loose += int(ok2_loose)
-
-                rec["reflection"] = {"text": refl_text, "meta": meta_r}
-                rec["retry"] = {
-                    "solution": sol2,
-                    "pred_final_strict": pred2_strict,
-                    "pred_final_loose": pred2_loose,
-                    "correct_strict": ok2_strict,
-                    "correct_loose": ok2_loose,
-                    "meta": meta2,
-                }
-
-            f_out.write(json.dumps(rec, ensure_ascii=False) + "\n")
-            n += 1
-
-    print(f"Wrote {n} examples to {output_jsonl}")
-    print(f"First-try accuracy (loose):  {first_correct_loose}/{n} = {first_correct_loose/max(n,1):.3f}")
-    print(f"First-try accuracy (strict): {first_correct_strict}/{n} = {first_correct_strict/max(n,1):.3f}")
-    if retries_attempted:
-        print(f"Retry success (loose | conditional):  {retry_correct_loose}/{retries_attempted} = {retry_correct_loose/max(retries_attempted,1):.3f}")
-        print(f"Retry success (strict| conditional): {retry_correct_strict}/{retries_attempted} = {retry_correct_strict/max(retries_attempted,1):.3f}")
-        print(f"Overall accuracy (loose):  {(first_correct_loose+retry_correct_loose)}/{n} = {(first_correct_loose+retry_correct_loose)/max(n,1):.3f}")
-        print(f"Overall accuracy (strict): {(first_correct_strict+retry_correct_strict)}/{n} = {(first_correct_strict+retry_correct_strict)/max(n,1):.3f}")
+    # Per-stage latency/throughput of the generations made by this invocation.
+    metrics_path = summary_path(output_jsonl)
+    metrics.write(metrics_path, output=output_jsonl, examples=stats.n, replay_from=replay_from)
+    print(f"Wrote generation metrics to {metrics_path}")
+    return metrics
@@ -0,0 +1,76 @@
+import itertools
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Tuple
+
+from src.utils.generator import GenConfig, Generator
+
+
+@dataclass
+class Job:
+    key: Any      # caller's handle, e.g. the example's input index
+    stage: str
+    prompt: str
+    seq: int = 0  # submission order, used for fairness
+
+
+class StageScheduler:
+    """
+    Continuous-batching queue over generation stages (solve / reflect / retry).
+
+    Each stage has its own queue and GenConfig. Every `step()` forms one batch
+    from whatever work is ready across all examples: stages whose GenConfigs are
+    equal (solve and retry by default) share a batch. The group that can fill a
+    whole batch goes first; otherwise the group holding the oldest job does, so
+    nothing starves.
+    """
+    def __init__(self, gen: Generator, stage_cfgs: Dict[str, GenConfig], batch_size: int = 8):
+        self.gen = gen
+        self.batch_size = batch_size
+        self.stage_cfgs = stage_cfgs
+        self.queues: Dict[str, Deque[Job]] = {stage: deque() for stage in stage_cfgs}
+        self._seq = itertools.count()
+        self.last_batch_s = 0.0
+
+        # GenConfig is an unhashable dataclass, so group stages by equality.
+        self.groups: List[Tuple[GenConfig, List[str]]] = []
+        for stage, cfg in stage_cfgs.items():
+            for group_cfg, stages in self.groups:
+                if group_cfg == cfg:
+                    stages.append(stage)
+                    break
+            else:
+                self.groups.append((cfg, [stage]))
+
+    def submit(self, key: Any, stage: str, prompt: str):
+        self.queues[stage].append(Job(key=key, stage=stage, prompt=prompt, seq=next(self._seq)))
+
+    def pending(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+
+    def _pick_group(self) -> Tuple[GenConfig, List[str]]:
+        ready = [(cfg, stages) for cfg, stages in self.groups if any(self.queues[s] for s in stages)]
+        full = [g for g in ready if sum(len(self.queues[s]) for s in g[1]) >= self.batch_size]
+        if full:
+            ready = full
+        return min(ready, key=lambda g: min(self.queues[s][0].seq for s in g[1] if self.queues[s]))
+
+    def step(self) -> List[Tuple[Job, Tuple[str, Dict[str, Any]]]]:
+        """Runs one batch and returns (job, (text, meta)) pairs; empty when nothing is queued."""
+        if not self.pending():
+            return []
+
+        cfg, stages = self._pick_group()
+        batch: List[Job] = []
+        while len(batch) < self.batch_size:
+            heads = [s for s in stages if self.queues[s]]
+            if not heads:
+                break
+            oldest = min(heads, key=lambda s: self.queues[s][0].seq)
+            batch.append(self.queues[oldest].popleft())
+
+        t0 = time.perf_counter()
+        outs = self.gen.generate_batch([job.prompt for job in batch], cfg)
+        self.last_batch_s = time.perf_counter() - t0
+        return list(zip(batch, outs))
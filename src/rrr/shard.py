@@ -0,0 +1,121 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional
+
+from src.rrr.rrr_infer import RRRStats, run_rrr_eval
+from src.utils import trace
+from src.utils.generator import make_generator
+from src.utils.metrics import RunMetrics, summary_path
+from src.utils.result_sink import open_sink, read_records
+
+
+def shard_output_path(output_jsonl: str, shard_id: int, num_shards: int) -> str:
+    root, ext = os.path.splitext(output_jsonl)
+    return f"{root}.shard{shard_id:03d}-of-{num_shards:03d}{ext or '.jsonl'}"
+
+
+def run_eval_job(gen_spec: Dict[str, Any], eval_kwargs: Dict[str, Any], trace_path: Optional[str] = None):
+    """
+    Builds the generator described by `gen_spec` (see make_generator) and runs
+    run_rrr_eval and returns its RunMetrics; with `trace_path`, spans are
+    recorded and exported there.
+    """
+    if trace_path:
+        trace.enable()
+    gen = make_generator(**gen_spec)
+    try:
+        return run_rrr_eval(gen=gen, **eval_kwargs)
+    finally:
+        if gen_spec.get("cache_db"):
+            # flush write-behind rows even if the run dies part way
+            gen.close()
+        if trace_path:
+            trace.export(trace_path)
+
+
+def _pin_threads(threads: Optional[int]):
+    # Runs in each worker before torch is imported, so the BLAS/OpenMP pools
+    # come up at the pinned size instead of one-thread-per-core per worker.
+    if not threads:
+        return
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def merge_shards(shard_paths: List[str], output_jsonl: str) -> RRRStats:
+    """
+    Concatenates shard outputs into one JSONL in input order (by "idx") and
+    recomputes the summary exactly as run_rrr_eval reports it.
+    """
+    recs = []
+    for path in shard_paths:
+        recs.extend(read_records(path))
+    recs.sort(key=lambda rec: rec["idx"])
+
+    for a, b in zip(recs, recs[1:]):
+        if a["idx"] == b["idx"]:
+            raise ValueError(f"example idx={a['idx']} appears in more than one shard")
+
+    stats = RRRStats()
+    with open_sink(output_jsonl) as sink:
+        for rec in recs:
+            sink.write(rec)
+            stats.add(rec)
+    stats.report(output_jsonl)
+    return stats
+
+
+def run_sharded(
+    gen_spec: Dict[str, Any],
+    eval_kwargs: Dict[str, Any],
+    num_shards: int,
+    threads_per_shard: Optional[int] = None,
+    trace_path: Optional[str] = None,
+) -> RRRStats:
+    """
+    Runs shard k of `num_shards` (input lines with idx % num_shards == k) in each
+    worker of a spawn-based process pool, each with its own generator and a pinned
+    thread count (default: the CPU count split evenly across shards), then merges
+    the shard files into `eval_kwargs["output_jsonl"]` and the shards' generation
+    metrics into its summary file. With `trace_path`, each shard exports its own
+    trace next to it.
+    """
+    output_jsonl = eval_kwargs["output_jsonl"]
+    if not threads_per_shard:
+        # unpinned, every shard would start a full-size thread pool and oversubscribe the box
+        threads_per_shard = max(1, (os.cpu_count() or 1) // num_shards)
+    paths = [shard_output_path(output_jsonl, k, num_shards) for k in range(num_shards)]
+
+    ctx = get_context("spawn")
+    with ProcessPoolExecutor(max_workers=num_shards, mp_context=ctx, initializer=_pin_threads, initargs=(threads_per_shard,)) as pool:
+        futures = [
+            pool.submit(
+                run_eval_job,
+                gen_spec,
+                {**eval_kwargs, "output_jsonl": path, "num_shards": num_shards, "shard_id": k},
+                shard_output_path(trace_path, k, num_shards) if trace_path else None,
+            )
+            for k, path in enumerate(paths)
+        ]
+        metrics = RunMetrics()
+        for fut in futures:
+            metrics.merge(fut.result())
+
+    print(f"[shard] merging {num_shards} shards", flush=True)
+    stats = merge_shards(paths, output_jsonl)
+    metrics_path = summary_path(output_jsonl)
+    metrics.write(
+        metrics_path,
+        output=output_jsonl,
+        examples=stats.n,
+        num_shards=num_shards,
+        replay_from=eval_kwargs.get("replay_from"),
+    )
+    print(f"Wrote generation metrics to {metrics_path}")
+    return stats
@@ -0,0 +1,136 @@
+"""
+First-mistake locator for the `llm_verifier` labeler (configs/step_credit.yaml).
+
+The verifier is asked whether a step prefix of a solution is still correct.
+Correctness of prefixes is monotone (once a step is wrong, every longer prefix
+is wrong), so the first wrong step is found by bisection in about
+log2(max_steps + 1) verifier calls instead of one per step.
+
+All rollouts bisect in lockstep: the queries of one depth go out as a single
+generate_batch call. Verdicts are memoized by (question, prefix text), so
+rollouts that share their opening steps share those calls.
+"""
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.step_credit.steps import split_steps
+from src.utils.generator import GenConfig, Generator
+from src.utils.prompt_assembly import AssembledPrompt
+from src.utils.trace import span
+
+VERIFY_HEADER = (
+    "You are checking a partial math solution.\n"
+    "Answer with exactly one word: YES if every step shown is correct so far, "
+    "NO if any step contains an error.\n\n"
+)
+
+
+def build_verify_prompt(question: str, prefix: str) -> str:
+    return AssembledPrompt([
+        VERIFY_HEADER + "Problem:\n",
+        f"{question}\n\n",
+        "Steps so far:\n",
+        f"{prefix}\n\n",
+        "Are all steps correct? Answer:",
+    ])
+
+
+def parse_verdict(text: str) -> bool:
+    # Only an explicit YES counts; anything unparseable is treated as a NO.
+    words = (text or "").strip().split()
+    return bool(words) and words[0].strip(".,:!").upper() == "YES"
+
+
+@dataclass
+class LocatorStats:
+    rollouts: int = 0
+    calls: int = 0         # verifier generations actually run
+    memo_hits: int = 0     # queries answered from the memo
+    linear_calls: int = 0  # what a front-to-back scan would have run for the same outcomes
+
+    @property
+    def saved(self) -> int:
+        return self.linear_calls - self.calls
+
+    def report(self):
+        print(
+            f"[LOCATOR] {self.rollouts} rollouts: {self.calls} verifier calls "
+            f"({self.memo_hits} memo hits), linear scan would need {self.linear_calls}; "
+            f"saved {self.saved}",
+            flush=True,
+        )
+
+
+class MistakeLocator:
+    """
+    `locate([(question, solution), ...])` returns, per rollout, the 0-based index
+    of the first wrong step (steps as in steps.split_steps, so labels line up
+    with StepCreditEngine), or None when every prefix is judged correct.
+    """
+    def __init__(
+        self,
+        gen: Generator,
+        max_steps: Optional[int] = 12,
+        cfg: GenConfig = GenConfig(max_new_tokens=4, temperature=0.0, stop_after_newlines=1),
+    ):
+        self.gen = gen
+        self.max_steps = max_steps
+        self.cfg = cfg
+        self.memo: Dict[Tuple[str, str], bool] = {}
+        self.stats = LocatorStats()
+
+    @classmethod
+    def from_config(cls, cfg: dict, gen: Generator, **kwargs) -> "MistakeLocator":
+        loc = cfg.get("method", {}).get("mistake_locator", {})
+        labeler = loc.get("labeler", "llm_verifier")
+        if labeler != "llm_verifier":
+            raise ValueError(f"Unknown mistake_locator.labeler: {labeler}")
+        return cls(gen, max_steps=loc.get("max_steps", 12), **kwargs)
+
+    def locate(self, rollouts: Sequence[Tuple[str, str]]) -> List[Optional[int]]:
+        # Per rollout: prefixes (by number of steps) and the bisection window.
+        # Invariant: the first wrong prefix length lies in [lo, hi]; hi == n + 1
+        # means no wrong prefix has been seen.
+        prefixes: List[List[str]] = []
+        lo: List[int] = []
+        hi: List[int] = []
+        for _, solution in rollouts:
+            spans = split_steps(solution, self.max_steps)
+            prefixes.append([solution[:end] for end in spans[:, 1]])
+            lo.append(1)
+            hi.append(len(spans) + 1)
+
+        depth = 0
+        while True:
+            active = [i for i in range(len(rollouts)) if lo[i] < hi[i]]
+            if not active:
+                break
+            mids = {i: (lo[i] + hi[i]) // 2 for i in active}
+            keys = {i: (rollouts[i][0], prefixes[i][mids[i] - 1]) for i in active}
+
+            self.stats.memo_hits += sum(keys[i] in self.memo for i in active)
+            # identical queries within a depth go out once
+            todo = list(dict.fromkeys(keys[i] for i in active if keys[i] not in self.memo))
+            if todo:
+                with span("locator.verify", depth=depth, n=len(todo)):
+                    outs = self.gen.generate_batch([build_verify_prompt(q, p) for q, p in todo], self.cfg)
+                self.stats.calls += len(todo)
+                for key, (text, _) in zip(todo, outs):
+                    self.memo[key] = parse_verdict(text)
+
+            for i in active:
+                if self.memo[keys[i]]:
+                    lo[i] = mids[i] + 1
+                else:
+                    hi[i] = mids[i]
+            depth += 1
+
+        results = []
+        for i in range(len(rollouts)):
+            n = len(prefixes[i])
+            first_bad = hi[i] - 1 if hi[i] <= n else None
+            results.append(first_bad)
+            # a linear scan asks about prefixes 1, 2, ... and stops at the first NO
+            self.stats.linear_calls += first_bad + 1 if first_bad is not None else n
+        self.stats.rollouts += len(rollouts)
+        return results
@@ -0,0 +1,180 @@
+"""
+Step segmentation and per-token credit weights for step-local credit assignment.
+
+A solution is split into reasoning steps (non-empty lines, the last step
+absorbing any lines past `max_steps`), and every token is mapped to the step
+its first character falls in. Given the first mistaken step of each rollout,
+tokens before it get `pre_error_weight` and tokens from it onward get
+`post_error_weight` (method.credit_assignment in configs/step_credit.yaml).
+
+Weights for a whole batch come out as padded [batch, tokens] arrays built with
+array ops only. Segmentations are cached per rollout text, so relabeling the
+mistake steps of the same rollouts costs no tokenization.
+"""
+import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+_LINE_RE = re.compile(r"[^\n]*\S[^\n]*")
+
+
+def split_steps(text: str, max_steps: Optional[int] = None) -> np.ndarray:
+    """[num_steps, 2] char spans of the steps of `text`; lines past `max_steps` join the last step."""
+    spans = np.array([m.span() for m in _LINE_RE.finditer(text)], dtype=np.int64).reshape(-1, 2)
+    if max_steps is not None and len(spans) > max_steps:
+        spans[max_steps - 1, 1] = spans[-1, 1]
+        spans = spans[:max_steps]
+    return spans
+
+
+@dataclass
+class Segmentation:
+    token_ids: np.ndarray   # [n] int64
+    step_ids: np.ndarray    # [n] int64, step index of each token
+    step_spans: np.ndarray  # [num_steps, 2] char spans
+
+    @property
+    def num_steps(self) -> int:
+        return len(self.step_spans)
+
+
+@dataclass
+class StepBatch:
+    token_ids: np.ndarray  # [B, T], padded with pad_id
+    step_ids: np.ndarray   # [B, T], -1 on padding
+    mask: np.ndarray       # [B, T] bool, True on real tokens
+    lengths: np.ndarray    # [B]
+    num_steps: np.ndarray  # [B]
+
+
+def pad_segmentations(segs: Sequence[Segmentation], pad_id: int = 0) -> StepBatch:
+    """Stacks segmentations into right-padded [B, T] arrays via one scatter."""
+    lengths = np.array([len(s.token_ids) for s in segs], dtype=np.int64)
+    width = int(lengths.max()) if len(segs) else 0
+    rows = np.repeat(np.arange(len(segs)), lengths)
+    cols = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+    token_ids = np.full((len(segs), width), pad_id, dtype=np.int64)
+    step_ids = np.full((len(segs), width), -1, dtype=np.int64)
+    if len(rows):
+        token_ids[rows, cols] = np.concatenate([s.token_ids for s in segs])
+        step_ids[rows, cols] = np.concatenate([s.step_ids for s in segs])
+    return StepBatch(
+        token_ids=token_ids,
+        step_ids=step_ids,
+        mask=step_ids >= 0,
+        lengths=lengths,
+        num_steps=np.array([s.num_steps for s in segs], dtype=np.int64),
+    )
+
+
+def step_weights(
+    step_ids: np.ndarray,
+    mistake_steps: Sequence[Optional[int]],
+    pre_error_weight: float = 0.1,
+    post_error_weight: float = 1.0,
+    no_error_weight: float = 1.0,
+) -> np.ndarray:
+    """
+    [B, T] float32 weights. Row b with first mistake at step k: pre_error_weight
+    on steps < k, post_error_weight on steps >= k. Rows whose mistake step is
+    None or negative (correct, or not located) get no_error_weight. Padding
+    (step id -1) gets 0.
+    """
+    m = np.array([-1 if k is None else k for k in mistake_steps], dtype=np.int64)[:, None]
+    w = np.where(step_ids < m, pre_error_weight, post_error_weight)
+    w = np.where(m < 0, no_error_weight, w)
+    return np.where(step_ids >= 0, w, 0.0).astype(np.float32)
+
+
+class StepSegmenter:
+    """
+    Tokenizes solutions and maps tokens to steps, with an LRU cache (keyed by
+    text) of up to `cache_size` segmentations. Needs a fast tokenizer, since the
+    token -> step map comes from its offset mapping.
+    """
+    def __init__(self, tokenizer, max_steps: Optional[int] = 12, cache_size: int = 100_000):
+        if not getattr(tokenizer, "is_fast", False):
+            raise ValueError("StepSegmenter needs a fast tokenizer (offset mappings)")
+        self.tokenizer = tokenizer
+        self.max_steps = max_steps
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Segmentation]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def segment(self, text: str) -> Segmentation:
+        seg = self._cache.get(text)
+        if seg is not None:
+            self._cache.move_to_end(text)
+            self.hits += 1
+            return seg
+
+        self.misses += 1
+        enc = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        token_ids = np.asarray(enc["input_ids"], dtype=np.int64)
+        tok_starts = np.asarray(enc["offset_mapping"], dtype=np.int64).reshape(-1, 2)[:, 0]
+        spans = split_steps(text, self.max_steps)
+        if len(spans):
+            # a token belongs to the last step starting at or before it; leading
+            # whitespace tokens fall into step 0
+            step_ids = np.maximum(np.searchsorted(spans[:, 0], tok_starts, side="right") - 1, 0)
+        else:
+            step_ids = np.zeros(len(token_ids), dtype=np.int64)
+        seg = Segmentation(token_ids=token_ids, step_ids=step_ids, step_spans=spans)
+
+        self._cache[text] = seg
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return seg
+
+    def batch(self, texts: Sequence[str], pad_id: Optional[int] = None) -> StepBatch:
+        if pad_id is None:
+            pad_id = self.tokenizer.pad_token_id or 0
+        return pad_segmentations([self.segment(t) for t in texts], pad_id=pad_id)
+
+
+class StepCreditEngine:
+    """Segmenter + weighting with the settings of configs/step_credit.yaml."""
+    def __init__(
+        self,
+        tokenizer,
+        max_steps: Optional[int] = 12,
+        pre_error_weight: float = 0.1,
+        post_error_weight: float = 1.0,
+        no_error_weight: float = 1.0,
+        cache_size: int = 100_000,
+    ):
+        self.segmenter = StepSegmenter(tokenizer, max_steps=max_steps, cache_size=cache_size)
+        self.pre_error_weight = pre_error_weight
+        self.post_error_weight = post_error_weight
+        self.no_error_weight = no_error_weight
+
+    @classmethod
+    def from_config(cls, cfg: dict, tokenizer, **kwargs) -> "StepCreditEngine":
+        method = cfg.get("method", {})
+        credit = method.get("credit_assignment", {})
+        return cls(
+            tokenizer,
+            max_steps=method.get("mistake_locator", {}).get("max_steps", 12),
+            pre_error_weight=credit.get("pre_error_weight", 0.1),
+            post_error_weight=credit.get("post_error_weight", 1.0),
+            **kwargs,
+        )
+
+    def weights(self, texts: Sequence[str], mistake_steps: Sequence[Optional[int]]) -> Tuple[StepBatch, np.ndarray]:
+        """(padded batch, [B, T] weights) for rollouts `texts` with their first mistaken steps."""
+        batch = self.segmenter.batch(texts)
+        # labels past max_steps point into the merged last step
+        mistake_steps = [None if k is None else min(k, max(n - 1, 0)) for k, n in zip(mistake_steps, batch.num_steps)]
+        w = step_weights(
+            batch.step_ids,
+            mistake_steps,
+            pre_error_weight=self.pre_error_weight,
+            post_error_weight=self.post_error_weight,
+            no_error_weight=self.no_error_weight,
+        )
+        return batch, w
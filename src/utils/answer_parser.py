@@ -1,4 +1,5 @@
 import re
+from typing import Iterable, List, Optional, Tuple
 
 # Matches integers, decimals, and simple fractions like 5/6
 _NUM_RE = re.compile(r"-?\d+(?:\.\d+)?(?:/\d+(?:\.\d+)?)?")
@@ -51,3 +52,89 @@ def extract_final_answer_loose(text: str):
     # 3) fallback: last number anywhere
     nums = _NUM_RE.findall(text)
     return nums[-1].strip() if nums else None
+
+
+_STRICT_RE = re.compile(r"####\s*\$?\s*([-+]?\d+(?:\.\d+)?(?:/\d+(?:\.\d+)?)?)")
+_HASH_LINE_RE = re.compile(r"####\s*([^\n\r]+)")
+_BOXED_RE = re.compile(r"\\boxed\{([^}]+)\}")
+_DIGIT_RE = re.compile(r"\d")
+
+
+def _is_num_char(ch: str) -> bool:
+    # every character _NUM_RE can consume
+    return ch in "-./" or ch.isdecimal()
+
+
+def extract_final_answers(text: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (strict, loose) for one text, identical to calling extract_final_answer_strict
+    and extract_final_answer_loose, but sharing one scan for "####" markers and
+    only looking at the tail of the text for the last-number fallback.
+    """
+    if not text:
+        return None, None
+
+    # Every "####" start (overlapping), left to right. Both the strict and the
+    # "####" loose patterns can only match at one of these.
+    marks = []
+    p = text.find("####")
+    while p != -1:
+        marks.append(p)
+        p = text.find("####", p + 1)
+
+    # STRICT: a strict match only consumes whitespace/$/sign/digits after "####",
+    # so no later marker is ever swallowed -> the last marker that matches wins.
+    strict = None
+    for p in reversed(marks):
+        m = _STRICT_RE.match(text, p)
+        if m:
+            strict = m.group(1).strip()
+            break
+
+    # LOOSE 1) #### line: replay finditer's left-to-right, non-overlapping walk.
+    loose = None
+    end = 0
+    for p in marks:
+        if p < end:
+            continue
+        m = _HASH_LINE_RE.match(text, p)
+        if m:
+            end = m.end()
+            m2 = _NUM_RE.search(m.group(1))
+            if m2:
+                loose = m2.group(0).strip()
+    if loose is not None:
+        return strict, loose
+
+    # 2) boxed
+    m = _BOXED_RE.search(text)
+    if m:
+        m2 = _NUM_RE.search(m.group(1))
+        if m2:
+            return strict, m2.group(0).strip()
+
+    # 3) fallback: last number anywhere. No number can span a character _NUM_RE
+    # never consumes, so scanning from just after the last such character before
+    # the final digit yields the same last match as scanning the whole text.
+    m = _DIGIT_RE.search(text[::-1])
+    if m is None:
+        return strict, None
+    start = len(text) - 1 - m.start()
+    while start > 0 and _is_num_char(text[start - 1]):
+        start -= 1
+    nums = _NUM_RE.findall(text, start)
+    return strict, (nums[-1].strip() if nums else None)
+
+
+def parse_many(texts: Iterable[str], workers: int = 1, chunksize: int = 256) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    extract_final_answers over many texts (e.g. every solution in a rollout file).
+    `workers > 1` fans out over a process pool.
+    """
+    if workers <= 1:
+        return [extract_final_answers(t) for t in texts]
+
+    from multiprocessing import Pool
+
+    with Pool(workers) as pool:
+        return pool.map(extract_final_answers, texts, chunksize=chunksize)
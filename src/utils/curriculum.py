@@ -0,0 +1,200 @@
+"""
+Difficulty-targeted curriculum sampling over prepared datasets.
+
+Every item keeps a Beta-smoothed pass-rate estimate, updated from rollout
+outcomes as they come in. Items are drawn with weight
+exp(-(p - target)^2 / (2 * width^2)) + floor, i.e. preferring items the policy
+solves about `target_pass_rate` of the time. Weights live in a Fenwick tree,
+so a draw and an update each cost O(log n) and nothing is rebuilt per step.
+
+Sources are `data.curriculum_paths` in the config (prepared JSONL, indexed or
+plain), concatenated in order.
+"""
+import os
+import random
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.utils.dataset import IndexedDataset, index_path, iter_examples
+
+
+class FenwickTree:
+    """Prefix sums over non-negative weights with point updates and weighted search."""
+    def __init__(self, weights: Sequence[float]):
+        self.n = len(weights)
+        self.values = [float(w) for w in weights]
+        self._tree = [0.0] * (self.n + 1)
+        self.rebuild()
+
+    def rebuild(self):
+        # O(n) construction; also clears accumulated floating-point drift
+        tree = [0.0] + self.values
+        for i in range(1, self.n + 1):
+            j = i + (i & -i)
+            if j <= self.n:
+                tree[j] += tree[i]
+        self._tree = tree
+
+    def set(self, i: int, value: float):
+        delta = value - self.values[i]
+        self.values[i] = value
+        i += 1
+        while i <= self.n:
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix_sum(self, i: int) -> float:
+        """Sum of values[:i]."""
+        s = 0.0
+        while i > 0:
+            s += self._tree[i]
+            i -= i & -i
+        return s
+
+    @property
+    def total(self) -> float:
+        return self.prefix_sum(self.n)
+
+    def find(self, target: float) -> int:
+        """Smallest i with prefix_sum(i + 1) > target, for 0 <= target < total."""
+        pos = 0
+        step = 1 << self.n.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.n and self._tree[nxt] <= target:
+                pos = nxt
+                target -= self._tree[nxt]
+            step >>= 1
+        return min(pos, self.n - 1)
+
+
+def _load(path: str):
+    # random access: the indexed store when present, else the records in memory
+    if os.path.exists(index_path(path)):
+        return IndexedDataset(path)
+    return [rec for _, rec in iter_examples(path)]
+
+
+class CurriculumSampler:
+    """
+    Samples item ids (positions in the concatenation of `paths`) by target
+    difficulty. Feed outcomes back with `update` / `update_from_record`.
+
+    `retry_credit` is the success credited when the first attempt failed but
+    the RRR retry succeeded: the item is within reach, though not solved outright.
+    """
+    def __init__(
+        self,
+        paths: Sequence[str],
+        target_pass_rate: float = 0.5,
+        width: float = 0.25,
+        floor: float = 0.01,
+        prior: Tuple[float, float] = (1.0, 1.0),
+        retry_credit: float = 0.5,
+        seed: Optional[int] = None,
+    ):
+        if not paths:
+            raise ValueError("CurriculumSampler needs at least one dataset path")
+        self.paths = list(paths)
+        self.sources = [_load(p) for p in self.paths]
+        sizes = [len(s) for s in self.sources]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        self.n = int(self.offsets[-1])
+
+        self.target_pass_rate = target_pass_rate
+        self.width = width
+        self.floor = floor
+        self.prior = prior
+        self.retry_credit = retry_credit
+        self.rng = random.Random(seed)
+
+        self.attempts = np.zeros(self.n, dtype=np.float64)
+        self.successes = np.zeros(self.n, dtype=np.float64)
+        self.tree = FenwickTree(self._weights(self.pass_rates()))
+        self._updates = 0
+
+    @classmethod
+    def from_config(cls, cfg: dict, default_paths: Sequence[str] = (), **kwargs) -> "CurriculumSampler":
+        paths = cfg.get("data", {}).get("curriculum_paths") or list(default_paths)
+        return cls(paths, seed=cfg.get("seed"), **kwargs)
+
+    def __len__(self) -> int:
+        return self.n
+
+    # ---- stats ----
+
+    def pass_rates(self) -> np.ndarray:
+        a, b = self.prior
+        return (self.successes + a) / (self.attempts + a + b)
+
+    def _weights(self, p):
+        return np.exp(-((p - self.target_pass_rate) ** 2) / (2 * self.width ** 2)) + self.floor
+
+    def update(self, item: int, successes: float, attempts: float = 1.0):
+        """Adds `successes` out of `attempts` for `item` and re-weights it; O(log n)."""
+        self.attempts[item] += attempts
+        self.successes[item] += successes
+        a, b = self.prior
+        p = (self.successes[item] + a) / (self.attempts[item] + a + b)
+        self.tree.set(item, float(self._weights(p)))
+        self._updates += 1
+        if self._updates % max(self.n, 1) == 0:
+            self.tree.rebuild()
+
+    def item_id(self, source: int, idx: int) -> int:
+        return int(self.offsets[source]) + idx
+
+    def update_from_record(self, rec: dict, source: int = 0):
+        """
+        Credits an output record of run_rrr_eval ("first" / "retry") or
+        run_rollouts ("samples") to the item it was generated for ("idx").
+        """
+        item = self.item_id(source, rec["idx"])
+        if "samples" in rec:
+            samples = rec["samples"]
+            self.update(item, sum(bool(s["correct"]) for s in samples), len(samples))
+        elif rec["first"]["correct_loose"]:
+            self.update(item, 1.0)
+        elif rec.get("retry") and rec["retry"]["correct_loose"]:
+            self.update(item, self.retry_credit)
+        else:
+            self.update(item, 0.0)
+
+    # ---- sampling ----
+
+    def sample(self, k: int = 1) -> List[int]:
+        """`k` item ids drawn with replacement, each in O(log n)."""
+        total = self.tree.total
+        return [self.tree.find(self.rng.random() * total) for _ in range(k)]
+
+    def get(self, item: int) -> dict:
+        source = int(np.searchsorted(self.offsets, item, side="right")) - 1
+        return self.sources[source][item - int(self.offsets[source])]
+
+    def sample_records(self, k: int = 1) -> List[Tuple[int, dict]]:
+        return [(i, self.get(i)) for i in self.sample(k)]
+
+    # ---- persistence ----
+
+    def state_dict(self) -> Dict[str, np.ndarray]:
+        return {"attempts": self.attempts.copy(), "successes": self.successes.copy()}
+
+    def load_state_dict(self, state: Dict[str, np.ndarray]):
+        if len(state["attempts"]) != self.n:
+            raise ValueError(f"curriculum state has {len(state['attempts'])} items, datasets have {self.n}")
+        self.attempts[:] = state["attempts"]
+        self.successes[:] = state["successes"]
+        self.tree = FenwickTree(self._weights(self.pass_rates()))
+
+    def save(self, path: str):
+        np.savez(path, **self.state_dict())
+
+    def load(self, path: str):
+        with np.load(path) as f:
+            self.load_state_dict({k: f[k] for k in f.files})
+
+    def close(self):
+        for s in self.sources:
+            if isinstance(s, IndexedDataset):
+                s.close()
@@ -0,0 +1,115 @@
+import json
+import mmap
+import os
+import random
+import sys
+from array import array
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from src.utils.answer_parser import extract_final_answer_strict
+
+INDEX_SUFFIX = ".idx"
+
+
+def index_path(path: str) -> str:
+    return path + INDEX_SUFFIX
+
+
+def write_indexed(records: Iterable[dict], path: str) -> int:
+    """
+    Writes `records` as compact JSONL (one per line, `gt_final` precomputed from
+    `answer`) plus `<path>.idx`: n+1 little-endian uint64 byte offsets, so record
+    i is the bytes [off[i], off[i+1]). The data file stays plain JSONL, so
+    anything that streams JSONL can still read it.
+    """
+    offsets = array("Q", [0])
+    with open(path, "wb") as f:
+        for rec in records:
+            rec = dict(rec)
+            if "gt_final" not in rec and "answer" in rec:
+                rec["gt_final"] = extract_final_answer_strict(rec["answer"])
+            f.write((json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+            offsets.append(f.tell())
+
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    with open(index_path(path), "wb") as f:
+        offsets.tofile(f)
+    return len(offsets) - 1
+
+
+class IndexedDataset:
+    """
+    O(1) random access into a store written by `write_indexed`. The data file is
+    memory-mapped; the offset table is a zero-copy uint64 view over the index bytes.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._data_f = open(path, "rb")
+        size = os.fstat(self._data_f.fileno()).st_size
+        self._data = mmap.mmap(self._data_f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+        with open(index_path(path), "rb") as f:
+            raw = f.read()
+        if sys.byteorder == "little":
+            self._offsets = memoryview(raw).cast("Q")
+        else:
+            self._offsets = array("Q")
+            self._offsets.frombytes(raw)
+            self._offsets.byteswap()
+
+        if len(self._offsets) == 0 or self._offsets[-1] != size:
+            raise ValueError(f"{index_path(path)} does not match {path}; rerun prepare_data")
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[dict, List[dict]]:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return json.loads(self._data[self._offsets[i]:self._offsets[i + 1]])
+
+    def iter_indices(self, indices: Iterable[int]) -> Iterator[Tuple[int, dict]]:
+        for i in indices:
+            yield i, self[i]
+
+    def shuffled(self, seed: int = 0) -> Iterator[Tuple[int, dict]]:
+        order = list(range(len(self)))
+        random.Random(seed).shuffle(order)
+        return self.iter_indices(order)
+
+    def close(self):
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data_f.close()
+
+
+def iter_examples(path: str, limit: Optional[int] = None, indices: Optional[Sequence[int]] = None) -> Iterator[Tuple[int, dict]]:
+    """
+    (input index, record) pairs from plain JSONL or an indexed store. With an
+    index present, `indices` selects a subset/order without scanning the file;
+    `limit` caps how many pairs are produced.
+    """
+    if os.path.exists(index_path(path)):
+        ds = IndexedDataset(path)
+        try:
+            it = ds.iter_indices(indices if indices is not None else range(len(ds)))
+            for n, pair in enumerate(it):
+                if limit is not None and n >= limit:
+                    break
+                yield pair
+        finally:
+            ds.close()
+        return
+
+    if indices is not None:
+        raise ValueError(f"{path} has no {INDEX_SUFFIX} index; write it with scripts/prepare_data.py --format indexed")
+    with open(path, "r", encoding="utf-8") as f:
+        for i, line in enumerate(f):
+            if limit is not None and i >= limit:
+                break
+            yield i, json.loads(line)
@@ -0,0 +1,206 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.utils.generator import GenConfig, Generator
+from src.utils.result_sink import _BackgroundSink
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS generations (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+
+class CachedGenerator(_BackgroundSink):
+    """
+    Content-addressed on-disk cache (SQLite) around any Generator.
+
+    Key = sha256 of backend, model name, weight format (HFGenerator.cpu_mode, when
+    not the fp32 default), prompt, GenConfig (incl. seed) and the number of
+    samples. Lookups read through to the wrapped generator on a miss; new results
+    are written behind by the result_sink._BackgroundSink writer thread, committed
+    `flush_every` rows at a time. The table is capped at `max_entries`, evicting
+    least recently used rows.
+
+    Sampled outputs (temperature > 0) are only cached when `cfg.seed` is set;
+    otherwise a hit would silently replay one fixed sample forever.
+
+    Every returned meta gets a "cache" entry with this call's outcome and the
+    running hit/miss counters.
+
+    Several processes (e.g. shards) may share one database; a locked database is
+    waited on for up to `timeout` seconds. A failed write stops the writer and is
+    re-raised by the next generate call or by close().
+    """
+    def __init__(self, gen: Generator, path: str, max_entries: int = 100_000, flush_every: int = 64, timeout: float = 30.0):
+        self.gen = gen
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self.timeout = timeout
+        self.backend = getattr(gen, "backend", type(gen).__name__)
+        self.model_name = getattr(gen, "model_name", None)
+        self.cpu_mode = getattr(gen, "cpu_mode", None)
+
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+        # gen_worker calls in from one thread per connection; reads go through _lock
+        self._conn = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SCHEMA)
+        self._conn.commit()
+
+        # Written-but-not-yet-flushed values, so reads see our own writes.
+        self._pending: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._wconn = None  # opened by the writer thread on first use
+        super().__init__()
+
+    def __getattr__(self, name):
+        # Expose the wrapped generator's attributes (tokenizer, model, ...).
+        if name == "gen":
+            raise AttributeError(name)
+        return getattr(self.gen, name)
+
+    # ---- keys ----
+
+    def _cacheable(self, cfg: GenConfig) -> bool:
+        return cfg.temperature <= 0 or cfg.seed is not None
+
+    def _key(self, prompt: str, cfg: GenConfig, num_samples: int) -> str:
+        payload = {
+            "backend": self.backend,
+            "model_name": self.model_name,
+            "prompt": prompt,
+            "cfg": asdict(cfg),
+            "num_samples": num_samples,
+        }
+        if self.cpu_mode not in (None, "fp32"):
+            # fp32 keeps the keys written before cpu modes existed
+            payload["cpu_mode"] = self.cpu_mode
+        blob = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    # ---- storage ----
+
+    def _lookup(self, key: str) -> Optional[list]:
+        with self._lock:
+            value = self._pending.get(key)
+            row = None
+            if value is None:
+                row = self._conn.execute("SELECT value FROM generations WHERE key = ?", (key,)).fetchone()
+        if value is None:
+            if row is None:
+                return None
+            value = row[0]
+            self.write(("touch", key, None))
+        return json.loads(value)
+
+    def _store(self, key: str, results: List[Tuple[str, Dict[str, Any]]]):
+        value = json.dumps([[text, meta] for text, meta in results], ensure_ascii=False)
+        with self._lock:
+            self._pending[key] = value
+        self.write(("put", key, value))
+
+    def _write_batch(self, ops: List[tuple]):
+        if self._wconn is None:
+            self._wconn = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False)
+        for i in range(0, len(ops), self.flush_every):
+            self._apply(self._wconn, ops[i:i + self.flush_every])
+
+    def _apply(self, conn, ops: list):
+        now = time.time()
+        puts = [(key, value, now) for kind, key, value in ops if kind == "put"]
+        touches = [(now, key) for kind, key, _ in ops if kind == "touch"]
+        if puts:
+            conn.executemany("INSERT OR REPLACE INTO generations (key, value, last_used) VALUES (?, ?, ?)", puts)
+        if touches:
+            conn.executemany("UPDATE generations SET last_used = ? WHERE key = ?", touches)
+        if puts:
+            (count,) = conn.execute("SELECT COUNT(*) FROM generations").fetchone()
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM generations WHERE key IN "
+                    "(SELECT key FROM generations ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+        conn.commit()
+
+        with self._lock:
+            for key, value, _ in puts:
+                if self._pending.get(key) == value:
+                    del self._pending[key]
+
+    def close(self):
+        """Flushes pending writes and closes the database; re-raises a failed write."""
+        try:
+            super().close()
+        finally:
+            if self._wconn is not None:
+                self._wconn.close()
+                self._wconn = None
+            self._conn.close()
+
+    # ---- Generator protocol ----
+
+    def _annotate(self, results, hit: bool, bypass: bool = False):
+        out = []
+        for text, meta in results:
+            meta = dict(meta)
+            meta["cache"] = {"hit": hit, "bypass": bypass, "hits": self.hits, "misses": self.misses}
+            out.append((text, meta))
+        return out
+
+    def generate(self, prompt: str, cfg: GenConfig) -> Tuple[str, Dict[str, Any]]:
+        return self.generate_batch([prompt], cfg)[0]
+
+    def generate_batch(self, prompts: List[str], cfg: GenConfig) -> List[Tuple[str, Dict[str, Any]]]:
+        self._raise_pending_error()
+        if not self._cacheable(cfg):
+            self.bypassed += len(prompts)
+            return self._annotate(self.gen.generate_batch(prompts, cfg), hit=False, bypass=True)
+
+        results: List[Tuple[str, Dict[str, Any]]] = [None] * len(prompts)
+        keys = [self._key(p, cfg, 1) for p in prompts]
+        miss_idx = []
+        for i, key in enumerate(keys):
+            cached = self._lookup(key)
+            if cached is None:
+                miss_idx.append(i)
+            else:
+                self.hits += 1
+                results[i] = self._annotate([tuple(cached[0])], hit=True)[0]
+
+        if miss_idx:
+            self.misses += len(miss_idx)
+            outs = self.gen.generate_batch([prompts[i] for i in miss_idx], cfg)
+            for i, res in zip(miss_idx, outs):
+                self._store(keys[i], [res])
+                results[i] = self._annotate([res], hit=False)[0]
+        return results
+
+    def generate_samples(self, prompt: str, cfg: GenConfig, num_samples: int) -> List[Tuple[str, Dict[str, Any]]]:
+        self._raise_pending_error()
+        if not self._cacheable(cfg):
+            self.bypassed += 1
+            return self._annotate(self.gen.generate_samples(prompt, cfg, num_samples), hit=False, bypass=True)
+
+        key = self._key(prompt, cfg, num_samples)
+        cached = self._lookup(key)
+        if cached is not None:
+            self.hits += 1
+            return self._annotate([tuple(r) for r in cached], hit=True)
+
+        self.misses += 1
+        outs = self.gen.generate_samples(prompt, cfg, num_samples)
+        self._store(key, outs)
+        return self._annotate(outs, hit=False)
@@ -0,0 +1,185 @@
+"""
+Long-lived generation worker: one process keeps a Generator (typically an
+HFGenerator) loaded and serves batched jobs to the entry points over a local
+socket, so iterating on evals does not pay model load time on every run.
+
+    python scripts/gen_worker.py --model Qwen/Qwen2.5-0.5B-Instruct          # server
+    python scripts/run_rrr_eval.py --worker ...                               # client
+
+Clients use WorkerGenerator, which implements the Generator protocol. Each
+connection is served on its own thread, but calls into the wrapped generator
+are serialized: one model, one batch at a time.
+
+multiprocessing.connection unpickles what it receives, so the authkey is what
+keeps other users from running code in the worker. It comes from the
+GEN_WORKER_AUTHKEY env var or, failing that, a random key the server writes to
+KEY_PATH (mode 0600) for clients of the same user to read. The default address
+is a Unix socket (mode 0600) in the same private directory. A TCP address
+("host:port") is accepted; clients on other machines need GEN_WORKER_AUTHKEY.
+"""
+import os
+import secrets
+import socket
+import stat
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from typing import Any, Dict, List, Tuple, Union
+
+from src.utils.generator import GenConfig, Generator
+
+RUN_DIR = os.path.join(os.path.expanduser("~"), ".cache", "rrr-gen-worker")
+DEFAULT_ADDRESS = os.path.join(RUN_DIR, "worker.sock")
+KEY_PATH = os.path.join(RUN_DIR, "authkey")
+
+Address = Union[str, Tuple[str, int]]
+
+
+def parse_address(address: str) -> Address:
+    """"host:port" -> a TCP address; anything else is taken as a Unix socket path."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return (host or "127.0.0.1", int(port))
+    return address
+
+
+def _run_dir() -> str:
+    os.makedirs(RUN_DIR, mode=0o700, exist_ok=True)
+    os.chmod(RUN_DIR, 0o700)
+    return RUN_DIR
+
+
+def _authkey(create: bool = False) -> bytes:
+    """GEN_WORKER_AUTHKEY, else the key in KEY_PATH (written by the server if missing)."""
+    env = os.getenv("GEN_WORKER_AUTHKEY")
+    if env:
+        return env.encode("utf-8")
+    if create and not os.path.exists(KEY_PATH):
+        _run_dir()
+        fd = os.open(KEY_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+    try:
+        with open(KEY_PATH, "r", encoding="utf-8") as f:
+            return f.read().strip().encode("utf-8")
+    except FileNotFoundError:
+        raise RuntimeError(
+            f"no generation worker key: set GEN_WORKER_AUTHKEY or start scripts/gen_worker.py (writes {KEY_PATH})"
+        ) from None
+
+
+def _clear_stale_socket(path: str):
+    """Removes a dead worker's socket file; refuses to touch a live socket or any other file."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(st.st_mode):
+        raise FileExistsError(f"{path} exists and is not a socket; pick another --address")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        os.remove(path)  # stale socket from a previous worker
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"a generation worker is already listening on {path}")
+
+
+def serve(gen: Generator, address: str = DEFAULT_ADDRESS):
+    """Serves `gen` until interrupted."""
+    lock = threading.Lock()
+    info = {
+        "backend": getattr(gen, "backend", type(gen).__name__),
+        "model_name": getattr(gen, "model_name", None),
+        "cpu_mode": getattr(gen, "cpu_mode", None),
+    }
+
+    def handle(conn):
+        with conn:
+            while True:
+                try:
+                    op, args = conn.recv()
+                except EOFError:
+                    return
+                try:
+                    if op == "info":
+                        result = info
+                    elif op == "generate_batch":
+                        with lock:
+                            result = gen.generate_batch(*args)
+                    elif op == "generate_samples":
+                        with lock:
+                            result = gen.generate_samples(*args)
+                    else:
+                        raise ValueError(f"unknown op: {op}")
+                except Exception as e:
+                    conn.send(("error", f"{type(e).__name__}: {e}"))
+                else:
+                    conn.send(("ok", result))
+
+    addr = parse_address(address)
+    if isinstance(addr, str):
+        if addr == DEFAULT_ADDRESS:
+            _run_dir()
+        _clear_stale_socket(addr)
+    with Listener(addr, authkey=_authkey(create=True)) as listener:
+        if isinstance(addr, str):
+            os.chmod(addr, 0o600)
+        print(f"[worker] serving {info['backend']}:{info['model_name']} on {address}", flush=True)
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, EOFError, OSError) as e:
+                # a client with the wrong key, or a probe that hung up mid-handshake
+                print(f"[worker] rejected a connection: {type(e).__name__}: {e}", flush=True)
+                continue
+            threading.Thread(target=handle, args=(conn,), name="gen-worker-conn", daemon=True).start()
+
+
+class WorkerGenerator:
+    """
+    Generator protocol client for a `serve` worker. `backend` / `model_name` /
+    `cpu_mode` mirror the served generator, so CachedGenerator keys are unchanged.
+    With `model_name` set, connecting to a worker serving another model fails.
+    """
+    def __init__(self, address: str = DEFAULT_ADDRESS, model_name: str = None):
+        self.address = address
+        self._conn = Client(parse_address(address), authkey=_authkey())
+        # one request/response in flight per connection
+        self._lock = threading.Lock()
+
+        info = self._call("info")
+        self.backend = info["backend"]
+        self.model_name = info["model_name"]
+        self.cpu_mode = info.get("cpu_mode")
+        if model_name is not None and model_name != self.model_name:
+            self.close()
+            raise ValueError(f"worker at {address} serves {self.model_name!r}, not {model_name!r}")
+
+    def _call(self, op: str, *args):
+        with self._lock:
+            self._conn.send((op, args))
+            status, result = self._conn.recv()
+        if status == "error":
+            raise RuntimeError(f"generation worker at {self.address}: {result}")
+        return result
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def generate(self, prompt: str, cfg: GenConfig) -> Tuple[str, Dict[str, Any]]:
+        return self.generate_batch([prompt], cfg)[0]
+
+    def generate_batch(self, prompts: List[str], cfg: GenConfig) -> List[Tuple[str, Dict[str, Any]]]:
+        return self._call("generate_batch", prompts, cfg)
+
+    def generate_samples(self, prompt: str, cfg: GenConfig, num_samples: int) -> List[Tuple[str, Dict[str, Any]]]:
+        return self._call("generate_samples", prompt, cfg, num_samples)
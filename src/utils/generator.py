@@ -1,12 +1,58 @@
 from dataclasses import dataclass
-from typing import Dict, Any, Tuple, Protocol
+from typing import Dict, Any, List, Optional, Tuple, Protocol
 
 @dataclass
 class GenConfig:
     max_new_tokens: int = 256
     temperature: float = 0.7
     top_p: float = 0.95
+    # Pins the sampling RNG; needed for sampled outputs to be reproducible (and cacheable).
+    seed: Optional[int] = None
+    # Early termination (see src/utils/stops.py): literal stop strings, stop once a
+    # "#### <number>" line is complete, stop after this many newlines.
+    stop: Tuple[str, ...] = ()
+    stop_after_final_answer: bool = False
+    stop_after_newlines: Optional[int] = None
 
 class Generator(Protocol):
     def generate(self, prompt: str, cfg: GenConfig) -> Tuple[str, Dict[str, Any]]:
         ...
+
+    def generate_batch(self, prompts: List[str], cfg: GenConfig) -> List[Tuple[str, Dict[str, Any]]]:
+        """Results are returned in the same order as `prompts`."""
+        ...
+
+    def generate_samples(self, prompt: str, cfg: GenConfig, num_samples: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """`num_samples` independent completions of one prompt from a single prefill."""
+        ...
+
+
+def make_generator(
+    backend: str,
+    model_name: str,
+    cache_db: Optional[str] = None,
+    cache_max_entries: int = 100_000,
+    **kwargs,
+) -> Generator:
+    """
+    Builds a backend by name ("hf" / "tinker", or "worker" to connect to a running
+    gen_worker at `address`); backend-specific options go through **kwargs. With
+    `cache_db`, the result is wrapped in a CachedGenerator, which the caller should
+    close() to flush pending writes.
+    """
+    if backend == "hf":
+        from src.utils.hf_generator import HFGenerator
+        gen = HFGenerator(model_name, **kwargs)
+    elif backend == "tinker":
+        from src.utils.tinker_generator import TinkerGenerator
+        gen = TinkerGenerator(model_name, **kwargs)
+    elif backend == "worker":
+        from src.utils.gen_worker import WorkerGenerator
+        gen = WorkerGenerator(model_name=model_name, **kwargs)
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
+
+    if cache_db:
+        from src.utils.gen_cache import CachedGenerator
+        gen = CachedGenerator(gen, cache_db, max_entries=cache_max_entries)
+    return gen
@@ -0,0 +1,72 @@
+"""
+StoppingCriteria hooks for HFGenerator. Kept apart from hf_generator.py because
+they subclass transformers classes, and transformers is only imported lazily.
+"""
+import time
+
+import torch
+from transformers import StoppingCriteria
+
+
+class FirstTokenClock(StoppingCriteria):
+    """
+    Never stops anything; records when generate() produced its first new token.
+    Criteria run once per decoding step, right after the step's tokens are
+    appended, so the first call marks the end of prefill + first decode.
+    """
+    def __init__(self):
+        self.t_first = None
+
+    def __call__(self, input_ids: torch.LongTensor, scores, **kwargs) -> torch.BoolTensor:
+        if self.t_first is None:
+            self.t_first = time.perf_counter()
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+
+
+class StopOnText(StoppingCriteria):
+    """
+    Per-row early stop on GenConfig's stop conditions (src/utils/stops.py).
+
+    Each call decodes only the tokens appended since the previous call (one per
+    step in plain decoding, a run of accepted tokens in assisted generation); the
+    row's full completion is decoded and checked only when those tokens contain a
+    character that could complete a stop condition, which keeps the per-step cost
+    flat. `stopped_at[row]` is the number of new tokens up to and including the
+    one that completed the stop.
+    """
+    def __init__(self, tokenizer, cfg, input_len: int, num_rows: int):
+        from src.utils.stops import trigger_chars
+
+        self.tokenizer = tokenizer
+        self.cfg = cfg
+        self.input_len = input_len
+        self.triggers = trigger_chars(cfg)
+        self.stopped_at = [None] * num_rows
+        self.checked = input_len  # columns already scanned (rows share one width)
+
+    def __call__(self, input_ids: torch.LongTensor, scores, **kwargs) -> torch.BoolTensor:
+        from src.utils.stops import stop_index
+
+        width = input_ids.shape[1]
+        live = [row for row, s in enumerate(self.stopped_at) if s is None]
+        if live and width > self.checked:
+            pieces = self.tokenizer.batch_decode(input_ids[live, self.checked:], skip_special_tokens=True)
+            hit = [row for row, piece in zip(live, pieces) if any(c in piece for c in self.triggers)]
+            if hit:
+                texts = self.tokenizer.batch_decode(input_ids[hit, self.input_len:], skip_special_tokens=True)
+                for row, text in zip(hit, texts):
+                    if stop_index(text, self.cfg) is not None:
+                        self.stopped_at[row] = self._first_stop(input_ids[row], width)
+        self.checked = width
+        done = [s is not None for s in self.stopped_at]
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+    def _first_stop(self, ids: torch.LongTensor, width: int) -> int:
+        """New-token count at which the stop first fires, searched within this call's tokens."""
+        from src.utils.stops import stop_index
+
+        for end in range(self.checked + 1, width):
+            text = self.tokenizer.decode(ids[self.input_len:end], skip_special_tokens=True)
+            if stop_index(text, self.cfg) is not None:
+                return end - self.input_len
+        return width - self.input_len
@@ -1,48 +1,332 @@
+import copy
 import time
-from typing import Dict, Any, Tuple
+from dataclasses import replace
+from typing import Dict, Any, List, Optional, Sequence, Tuple
 from src.utils.generator import GenConfig
+from src.utils.prefix_cache import PrefixEntry, PrefixKVCache
+from src.utils.prompt_assembly import PromptAssembler
+from src.utils.stops import has_stops, stop_index
+from src.utils.trace import span
+
+
+def cpu_kwargs_from_config(cfg: dict) -> Dict[str, Any]:
+    """HFGenerator cpu_mode / num_threads from the `model` section of configs/base.yaml (keys that are set)."""
+    model = cfg.get("model", {})
+    return {k: model[k] for k in ("cpu_mode", "num_threads") if model.get(k) is not None}
+
 
 class HFGenerator:
-    def __init__(self, model_name: str):
-        from transformers import AutoModelForCausalLM, AutoTokenizer
+    """
+    `prefixes` lists fixed prompt headers (e.g. rrr_infer.PROMPT_PREFIXES). With
+    `prefix_cache_size > 0`, the KV cache of each header's prefill is computed once,
+    kept in an LRU cache, and reused by every batched prompt that starts with it.
+
+    Without CUDA, `cpu_mode` picks the weight format: "fp32" (default), "bf16",
+    or "int8" (dynamic int8 quantization of the nn.Linear layers; activations
+    stay fp32). `num_threads` sets torch's intra-op thread count.
+
+    `draft_model` names a small model with the same tokenizer (e.g. Qwen2.5-0.5B
+    for a 1.5B target) used for assisted generation: it proposes a few tokens,
+    the target verifies them in one forward pass. Outputs follow the target's
+    distribution. transformers only supports this one sequence at a time, so
+    batches are decoded row by row and the prefix cache is not used.
+    """
+    backend = "hf"
+    CPU_MODES = ("fp32", "bf16", "int8")
+
+    def __init__(
+        self,
+        model_name: str,
+        max_batch_size: int = 8,
+        prefixes: Sequence[str] = (),
+        prefix_cache_size: int = 0,
+        cpu_mode: str = "fp32",
+        num_threads: Optional[int] = None,
+        draft_model: Optional[str] = None,
+    ):
+        from transformers import AutoTokenizer
         import torch
 
+        if cpu_mode not in self.CPU_MODES:
+            raise ValueError(f"cpu_mode must be one of {self.CPU_MODES}, got {cpu_mode!r}")
+        if num_threads:
+            torch.set_num_threads(num_threads)
+
         self.model_name = model_name
+        self.max_batch_size = max_batch_size
         self.torch = torch
+        self.cpu_mode = cpu_mode if not torch.cuda.is_available() else None
         self.tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
-        self.model = AutoModelForCausalLM.from_pretrained(
-            model_name,
-            torch_dtype=torch.float16 if torch.cuda.is_available() else None,
-            device_map="auto" if torch.cuda.is_available() else None,
-        )
+        if torch.cuda.is_available():
+            dtype = torch.float16
+        else:
+            dtype = torch.bfloat16 if cpu_mode == "bf16" else None
+        self.model = self._load_model(model_name, dtype)
+
+        self.draft_model_name = draft_model
+        self.draft = None
+        if draft_model is not None:
+            draft_tokenizer = AutoTokenizer.from_pretrained(draft_model, use_fast=True)
+            if draft_tokenizer.get_vocab() != self.tokenizer.get_vocab():
+                raise ValueError(f"draft model {draft_model} does not share the tokenizer of {model_name}")
+            self.draft = self._load_model(draft_model, dtype)
+            self.draft.eval()
+            # forward passes per generate call: one target pass verifies a run of draft tokens
+            self._forwards = {"target": 0, "draft": 0}
+            self.model.register_forward_pre_hook(lambda *_: self._count_forward("target"))
+            self.draft.register_forward_pre_hook(lambda *_: self._count_forward("draft"))
+            if prefix_cache_size > 0:
+                print("[hf] prefix cache is off with a draft model (assisted generation manages its own cache)")
+                prefix_cache_size = 0
         if self.tokenizer.pad_token_id is None:
             self.tokenizer.pad_token_id = self.tokenizer.eos_token_id   
+        # Decoder-only models must be left-padded so every row continues from its last prompt token.
+        self.tokenizer.padding_side = "left"
         self.model.eval()
+        # prompts from the build_*_prompt helpers reuse cached fragment ids
+        self.assembler = PromptAssembler(self.tokenizer)
+
+        # Longest first so the most specific header wins.
+        self.prefixes = sorted(prefixes, key=len, reverse=True)
+        self.prefix_cache = PrefixKVCache(prefix_cache_size) if prefix_cache_size > 0 else None
+
+    def _load_model(self, name: str, dtype):
+        from transformers import AutoModelForCausalLM
+
+        model = AutoModelForCausalLM.from_pretrained(
+            name,
+            torch_dtype=dtype,
+            device_map="auto" if self.torch.cuda.is_available() else None,
+        )
+        if self.cpu_mode == "int8":
+            model = self.torch.ao.quantization.quantize_dynamic(model, {self.torch.nn.Linear}, dtype=self.torch.qint8)
+        return model
+
+    def _count_forward(self, which: str):
+        self._forwards[which] += 1
+
+    def generate(self, prompt: str, cfg: GenConfig) -> Tuple[str, Dict[str, Any]]:
+        return self.generate_batch([prompt], cfg)[0]
 
-    def generate(self, prompt: str, cfg: GenConfig):
-        inputs = self.tokenizer(prompt, return_tensors="pt")
-        if self.torch.cuda.is_available():
-            inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
+    def generate_batch(self, prompts: List[str], cfg: GenConfig) -> List[Tuple[str, Dict[str, Any]]]:
+        with span("hf.tokenize", n=len(prompts)):
+            encoded = [self.assembler.encode(p) for p in prompts]
 
+        # Rows sharing a cached header are batched together (key None = no usable prefix).
+        groups: Dict[Optional[str], List[int]] = {}
+        entries: Dict[Optional[str], Optional[PrefixEntry]] = {None: None}
+        for i, p in enumerate(prompts):
+            prefix = self._match_prefix(p, encoded[i], entries)
+            groups.setdefault(prefix, []).append(i)
+
+        results: List[Tuple[str, Dict[str, Any]]] = [None] * len(prompts)
+        for prefix, rows in groups.items():
+            # Length bucketing: sort by prompt length so each padded batch wastes little on padding.
+            order = sorted(rows, key=lambda i: len(encoded[i]))
+            for start in range(0, len(order), self.max_batch_size):
+                idxs = order[start:start + self.max_batch_size]
+                outs = self._generate_padded([encoded[i] for i in idxs], cfg, prefix_entry=entries[prefix])
+                for i, res in zip(idxs, outs):
+                    results[i] = res
+        return results
+
+    def _match_prefix(self, prompt: str, ids: List[int], entries: Dict) -> Optional[str]:
+        if self.prefix_cache is None:
+            return None
+        for prefix in self.prefixes:
+            if not prompt.startswith(prefix):
+                continue
+            if prefix not in entries:
+                entries[prefix] = self._prefix_entry(prefix)
+            prefix_ids = entries[prefix].ids
+            # The header must tokenize identically on its own and inside the prompt,
+            # and leave at least one token to feed through generate.
+            if len(ids) > len(prefix_ids) and ids[:len(prefix_ids)] == prefix_ids:
+                return prefix
+        return None
+
+    def _prefix_entry(self, prefix: str) -> PrefixEntry:
+        entry = self.prefix_cache.get(prefix)
+        if entry is None:
+            ids = self.tokenizer(prefix)["input_ids"]
+            with span("hf.prefix_prefill", tokens=len(ids)), self.torch.no_grad():
+                out = self.model(input_ids=self.torch.tensor([ids], device=self.model.device), use_cache=True)
+            past = out.past_key_values
+            if isinstance(past, tuple):
+                # older transformers return the legacy tuple format
+                from transformers import DynamicCache
+                past = DynamicCache.from_legacy_cache(past)
+            entry = PrefixEntry(ids=ids, past_key_values=past)
+            self.prefix_cache.put(prefix, entry)
+        return entry
+
+    def _prefix_inputs(self, batch_ids: List[List[int]], entry: PrefixEntry):
+        """
+        Builds [prefix | pad | suffix] rows. The padding sits between the cached
+        prefix and each suffix; the attention mask hides it and position ids are
+        derived from the mask, so every row sees the same positions it would unpadded.
+        """
+        p = len(entry.ids)
+        suffixes = [ids[p:] for ids in batch_ids]
+        width = max(len(s) for s in suffixes)
+        pad_id = self.tokenizer.pad_token_id
+
+        input_ids = [entry.ids + [pad_id] * (width - len(s)) + s for s in suffixes]
+        attention_mask = [[1] * p + [0] * (width - len(s)) + [1] * len(s) for s in suffixes]
+        inputs = {
+            "input_ids": self.torch.tensor(input_ids, device=self.model.device),
+            "attention_mask": self.torch.tensor(attention_mask, device=self.model.device),
+        }
+
+        # generate() appends to the cache in place, so hand it a private copy.
+        past = copy.deepcopy(entry.past_key_values)
+        past.batch_repeat_interleave(len(batch_ids))
+        return inputs, past
+
+    def generate_samples(self, prompt: str, cfg: GenConfig, num_samples: int) -> List[Tuple[str, Dict[str, Any]]]:
+        # num_return_sequences expands the prompt inside generate, so it is encoded once.
+        with span("hf.tokenize", n=1):
+            ids = self.assembler.encode(prompt)
+        if cfg.temperature <= 0:
+            # greedy decoding gives every sample the same text (and HF rejects num_return_sequences > 1)
+            text, meta = self._generate_padded([ids], cfg)[0]
+            return [(text, dict(meta, num_samples=num_samples)) for _ in range(num_samples)]
+        return self._generate_padded([ids], cfg, num_return_sequences=num_samples)
+
+    def _generate_padded(
+        self,
+        batch_ids: List[List[int]],
+        cfg: GenConfig,
+        num_return_sequences: int = 1,
+        prefix_entry: Optional[PrefixEntry] = None,
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Rows come back grouped by prompt: num_return_sequences consecutive rows per input."""
+        if self.draft is not None and (len(batch_ids) > 1 or num_return_sequences > 1):
+            # assisted generation takes one sequence at a time; seed once so samples still differ
+            if cfg.seed is not None:
+                self.torch.manual_seed(cfg.seed)
+                cfg = replace(cfg, seed=None)
+            return [
+                res
+                for ids in batch_ids
+                for _ in range(num_return_sequences)
+                for res in self._generate_padded([ids], cfg)
+            ]
+
+        cache_kwargs = {}
+        with span("hf.pad", rows=len(batch_ids)):
+            if prefix_entry is not None:
+                inputs, cache_kwargs["past_key_values"] = self._prefix_inputs(batch_ids, prefix_entry)
+            else:
+                inputs = self.tokenizer.pad({"input_ids": batch_ids}, padding=True, return_tensors="pt")
+                if self.torch.cuda.is_available():
+                    inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
+
+        # With left padding every row's new tokens start at the same column.
         input_len = inputs["input_ids"].shape[1]
 
-        t0 = time.time()
-        with self.torch.no_grad():
+        sampling = {"do_sample": False}
+        if cfg.temperature > 0:
+            sampling = {"do_sample": True, "temperature": cfg.temperature, "top_p": cfg.top_p}
+
+        if cfg.seed is not None:
+            self.torch.manual_seed(cfg.seed)
+
+        from transformers import StoppingCriteriaList
+        from src.utils.hf_criteria import FirstTokenClock, StopOnText
+        clock = FirstTokenClock()
+        criteria = [clock]
+        stopper = None
+        if has_stops(cfg):
+            stopper = StopOnText(self.tokenizer, cfg, input_len, len(batch_ids) * num_return_sequences)
+            criteria.append(stopper)
+        if self.draft is not None:
+            cache_kwargs["assistant_model"] = self.draft
+            self._forwards.update(target=0, draft=0)
+
+        t0 = time.perf_counter()
+        with span("hf.model.generate", rows=len(batch_ids) * num_return_sequences, width=input_len), self.torch.no_grad():
             out = self.model.generate(
                 **inputs,
                 max_new_tokens=cfg.max_new_tokens,
-                do_sample=True,
-                temperature=cfg.temperature,
-                top_p=cfg.top_p,
+                num_return_sequences=num_return_sequences,
+                **sampling,
+                **cache_kwargs,
+                stopping_criteria=StoppingCriteriaList(criteria),
                 eos_token_id=self.tokenizer.eos_token_id,
                 pad_token_id=self.tokenizer.pad_token_id
             )
-        dt = time.time() - t0
+        dt = time.perf_counter() - t0
+        ttft = clock.t_first - t0 if clock.t_first is not None else None
 
         # ✅ decode ONLY new tokens
-        gen_ids = out[0, input_len:]
-        text = self.tokenizer.decode(gen_ids, skip_special_tokens=True).strip()
+        with span("hf.decode"):
+            new_ids = out[:, input_len:]
+            texts = self.tokenizer.batch_decode(new_ids, skip_special_tokens=True)
+            gen_lens = self._generated_lengths(new_ids)
+
+        stopped = [False] * len(texts)
+        if stopper is not None:
+            for row, text in enumerate(texts):
+                # checked on the final text too: the stop token may carry text past the
+                # cut, and the row is padded after it
+                cut = stop_index(text, cfg)
+                if cut is not None:
+                    stopped[row] = True
+                    texts[row] = text[:cut]
+                    if stopper.stopped_at[row] is not None:
+                        gen_lens[row] = stopper.stopped_at[row]
+
+        results = []
+        for row, text in enumerate(texts):
+            # rows are grouped by prompt, num_return_sequences per prompt
+            prompt_tokens = len(batch_ids[row // num_return_sequences])
+            meta = {
+                "latency_s": dt,
+                "ttft_s": ttft,
+                "prompt_tokens": prompt_tokens,
+                "gen_tokens": gen_lens[row],
+                "tokens_per_s": gen_lens[row] / dt if dt > 0 else None,
+                "stopped_early": stopped[row],
+                # decode budget left when the stop fired (an upper bound on what it saved)
+                "tokens_saved": cfg.max_new_tokens - gen_lens[row] if stopped[row] else 0,
+                "batch_gen_tokens": sum(gen_lens),
+                "model_name": self.model_name,
+                "backend": self.backend,
+                "cpu_mode": self.cpu_mode,
+                "batch_size": len(batch_ids),
+                "num_samples": num_return_sequences,
+                "prefix_cached_tokens": len(prefix_entry.ids) if prefix_entry is not None else 0,
+            }
+            if self.draft is not None:
+                meta.update(self._draft_stats(new_ids.shape[1]))
+            results.append((text.strip(), meta))
+        return results
 
-        meta = {"latency_s": dt, "model_name": self.model_name, "backend": "hf"}
-        return text, meta
+    def _draft_stats(self, new_tokens: int) -> Dict[str, Any]:
+        """
+        Each target pass keeps the accepted draft tokens plus one token of its own,
+        and each draft pass proposes one token, so accepted = new tokens - target
+        passes and proposed = draft passes.
+        """
+        proposed = self._forwards["draft"]
+        accepted = max(new_tokens - self._forwards["target"], 0)
+        return {
+            "draft_model": self.draft_model_name,
+            "target_forwards": self._forwards["target"],
+            "draft_tokens": proposed,
+            "draft_accepted": accepted,
+            "acceptance_rate": accepted / proposed if proposed else None,
+        }
 
+    def _generated_lengths(self, new_ids) -> List[int]:
+        """Per-row count of generated tokens, up to and including the first EOS (padding excluded)."""
+        width = new_ids.shape[1]
+        if width == 0:
+            return [0] * new_ids.shape[0]
+        done = new_ids == self.tokenizer.eos_token_id
+        if self.tokenizer.pad_token_id is not None:
+            done |= new_ids == self.tokenizer.pad_token_id
+        first = done.int().argmax(dim=1)
+        lens = self.torch.where(done.any(dim=1), first + 1, self.torch.full_like(first, width))
+        return lens.tolist()
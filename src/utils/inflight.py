@@ -0,0 +1,54 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Tuple, Type
+
+
+class InFlightSampler:
+    """
+    Keeps up to `max_in_flight` remote requests outstanding at once.
+
+    `call(item)` issues one request and blocks until it resolves (e.g. Tinker's
+    `sampling_client.sample(...).result()`); it runs on a worker thread.
+    Failures of a `retry_on` type are reissued with exponential backoff;
+    anything else propagates. Results come back in input order.
+
+    Nothing here depends on Tinker, so it can be driven by a local fake client.
+    """
+    def __init__(
+        self,
+        max_in_flight: int = 8,
+        max_retries: int = 3,
+        backoff_s: float = 1.0,
+        retry_on: Tuple[Type[BaseException], ...] = (ConnectionError, TimeoutError),
+    ):
+        if max_in_flight < 1:
+            raise ValueError(f"max_in_flight must be >= 1, got {max_in_flight}")
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self.retry_on = retry_on
+
+    def _call_with_retry(self, call: Callable[[Any], Any], item: Any) -> Any:
+        attempt = 0
+        while True:
+            try:
+                return call(item)
+            except self.retry_on:
+                if attempt >= self.max_retries:
+                    raise
+                # exponential backoff with jitter so parallel retries don't stampede
+                time.sleep(self.backoff_s * (2 ** attempt) * (0.5 + random.random()))
+                attempt += 1
+
+    def map(self, call: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+        slots = threading.BoundedSemaphore(self.max_in_flight)
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            futures = []
+            for item in items:
+                slots.acquire()
+                fut = pool.submit(self._call_with_retry, call, item)
+                fut.add_done_callback(lambda _: slots.release())
+                futures.append(fut)
+            return [fut.result() for fut in futures]
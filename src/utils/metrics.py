@@ -0,0 +1,95 @@
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Linear-interpolated percentile (q in [0, 100]); None for no values."""
+    if not values:
+        return None
+    vals = sorted(values)
+    pos = (len(vals) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(vals) - 1)
+    return vals[lo] + (vals[hi] - vals[lo]) * (pos - lo)
+
+
+def summary_path(output_jsonl: str) -> str:
+    root, _ = os.path.splitext(output_jsonl)
+    return root + ".summary.json"
+
+
+class StageMetrics:
+    """Latency / token counters for one generation stage, fed one batch at a time."""
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.ttfts: List[float] = []
+        self.requests = 0
+        self.batches = 0
+        self.prompt_tokens = 0
+        self.gen_tokens = 0
+        self.stopped_early = 0
+        self.tokens_saved = 0
+        self.draft_tokens = 0
+        self.draft_accepted = 0
+        self.wall_s = 0.0
+
+    def add_batch(self, wall_s: float, metas: List[Dict[str, Any]]):
+        self.batches += 1
+        self.wall_s += wall_s
+        for meta in metas:
+            self.requests += 1
+            self.latencies.append(meta.get("latency_s", 0.0))
+            if meta.get("ttft_s") is not None:
+                self.ttfts.append(meta["ttft_s"])
+            self.prompt_tokens += meta.get("prompt_tokens") or 0
+            self.gen_tokens += meta.get("gen_tokens") or 0
+            self.stopped_early += bool(meta.get("stopped_early"))
+            self.tokens_saved += meta.get("tokens_saved") or 0
+            self.draft_tokens += meta.get("draft_tokens") or 0
+            self.draft_accepted += meta.get("draft_accepted") or 0
+
+    def merge(self, other: "StageMetrics"):
+        """Adds another run's counters, e.g. another shard's (wall_s then sums shard busy time)."""
+        self.latencies.extend(other.latencies)
+        self.ttfts.extend(other.ttfts)
+        for name in ("requests", "batches", "prompt_tokens", "gen_tokens", "stopped_early",
+                     "tokens_saved", "draft_tokens", "draft_accepted", "wall_s"):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "latency_s": {f"p{q}": percentile(self.latencies, q) for q in (50, 95, 99)},
+            "ttft_s": {f"p{q}": percentile(self.ttfts, q) for q in (50, 95, 99)},
+            "prompt_tokens": self.prompt_tokens,
+            "gen_tokens": self.gen_tokens,
+            "stopped_early": self.stopped_early,
+            "tokens_saved": self.tokens_saved,
+            # assisted generation (hf --draft_model): share of proposed draft tokens the target kept
+            "draft_tokens": self.draft_tokens,
+            "draft_acceptance": self.draft_accepted / self.draft_tokens if self.draft_tokens else None,
+            "wall_s": self.wall_s,
+            # generated tokens per second of wall time spent in this stage's batches
+            "gen_tokens_per_s": self.gen_tokens / self.wall_s if self.wall_s > 0 else None,
+        }
+
+
+class RunMetrics:
+    def __init__(self):
+        self.stages: Dict[str, StageMetrics] = {}
+
+    def add_batch(self, stage: str, wall_s: float, metas: List[Dict[str, Any]]):
+        self.stages.setdefault(stage, StageMetrics()).add_batch(wall_s, metas)
+
+    def merge(self, other: "RunMetrics"):
+        for stage, m in other.stages.items():
+            self.stages.setdefault(stage, StageMetrics()).merge(m)
+
+    def summary(self) -> Dict[str, Any]:
+        return {stage: m.summary() for stage, m in self.stages.items()}
+
+    def write(self, path: str, **extra):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({**extra, "stages": self.summary()}, f, indent=2)
@@ -0,0 +1,43 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+
+@dataclass
+class PrefixEntry:
+    ids: List[int]
+    past_key_values: Any
+
+
+class PrefixKVCache:
+    """
+    Bounded LRU map: prefix text -> token ids + past_key_values of its prefill.
+
+    Entries are never mutated by generation; callers take a copy of
+    `past_key_values` before handing it to `model.generate`.
+    """
+    def __init__(self, max_entries: int = 8):
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be >= 1, got {max_entries}")
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, PrefixEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, prefix: str) -> Optional[PrefixEntry]:
+        entry = self._entries.get(prefix)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(prefix)
+        self.hits += 1
+        return entry
+
+    def put(self, prefix: str, entry: PrefixEntry):
+        self._entries[prefix] = entry
+        self._entries.move_to_end(prefix)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,117 @@
+"""
+Prompt assembly from cached token ids.
+
+The build_*_prompt helpers return an AssembledPrompt: an ordinary str that also
+remembers the fragments it was joined from (constant template text, question,
+reflection, ...). PromptAssembler.encode tokenizes each fragment once, caching
+ids by fragment text, and concatenates them, so the question shared by the
+solve, reflect and retry prompts is tokenized a single time.
+
+Concatenated ids equal the ids of the whole string only if BPE never merges
+across a fragment boundary. A boundary is used only when the tokenizer's
+pre-tokenizer splits there (checked on a window around it, cached); anything
+else, and any plain str, falls back to tokenizing the full text.
+scripts/check_prompt_assembly.py verifies equality over a dataset file.
+"""
+from collections import OrderedDict
+from typing import Iterable, List, Tuple
+
+# chars of context either side of a boundary handed to the pre-tokenizer
+_WINDOW = 64
+
+
+class AssembledPrompt(str):
+    """A str built from `parts`; behaves exactly like "".join(parts)."""
+    parts: Tuple[str, ...]
+
+    def __new__(cls, parts: Iterable[str]):
+        parts = tuple(p for p in parts if p)
+        s = super().__new__(cls, "".join(parts))
+        s.parts = parts
+        return s
+
+    def __reduce__(self):
+        return (AssembledPrompt, (self.parts,))
+
+
+class PromptAssembler:
+    """
+    Encodes prompts like `tokenizer(prompt)["input_ids"]` (special tokens
+    included), reusing cached fragment ids for AssembledPrompts. Assembly is
+    switched off for tokenizers without a fast backend pre-tokenizer, or whose
+    fragment ids fail a probe at construction.
+    """
+    def __init__(self, tokenizer, cache_size: int = 65_536):
+        self.tokenizer = tokenizer
+        self.cache_size = cache_size
+        self._ids: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._boundaries = {}
+        self.hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+
+        backend = getattr(tokenizer, "backend_tokenizer", None)
+        self._pre_tokenizer = backend.pre_tokenizer if backend is not None else None
+        self._normalizer = backend.normalizer if backend is not None else None
+        self.enabled = self._pre_tokenizer is not None and self._find_specials() and self._probe()
+
+    def _find_specials(self) -> bool:
+        # ids the tokenizer wraps around a body, e.g. a BOS prefix
+        full = self.tokenizer("a")["input_ids"]
+        body = self.tokenizer("a", add_special_tokens=False)["input_ids"]
+        for i in range(len(full) - len(body) + 1):
+            if full[i:i + len(body)] == body:
+                self._prefix_ids, self._suffix_ids = full[:i], full[i + len(body):]
+                return True
+        return False
+
+    def _probe(self) -> bool:
+        probe = AssembledPrompt(["Header:\n\nProblem:\n", "A 3-step question?\n\n", "Answer:", " 42\n"])
+        ok = self._assemble(probe) in (None, self.tokenizer(probe)["input_ids"])
+        self._ids.clear()
+        return ok
+
+    def _normalize(self, text: str) -> str:
+        return self._normalizer.normalize_str(text) if self._normalizer is not None else text
+
+    def _boundary_ok(self, left: str, right: str) -> bool:
+        key = (left[-_WINDOW:], right[:_WINDOW])
+        ok = self._boundaries.get(key)
+        if ok is None:
+            l, r = self._normalize(key[0]), self._normalize(key[1])
+            window = self._normalize(key[0] + key[1])
+            starts = {start for _, (start, _) in self._pre_tokenizer.pre_tokenize_str(window)}
+            ok = window == l + r and len(l) in starts
+            self._boundaries[key] = ok
+        return ok
+
+    def _fragment_ids(self, text: str) -> List[int]:
+        ids = self._ids.get(text)
+        if ids is not None:
+            self._ids.move_to_end(text)
+            self.hits += 1
+            return ids
+        self.misses += 1
+        ids = self.tokenizer(text, add_special_tokens=False)["input_ids"]
+        self._ids[text] = ids
+        if len(self._ids) > self.cache_size:
+            self._ids.popitem(last=False)
+        return ids
+
+    def _assemble(self, prompt: "AssembledPrompt"):
+        parts = prompt.parts
+        if not all(self._boundary_ok(a, b) for a, b in zip(parts, parts[1:])):
+            return None
+        ids = list(self._prefix_ids)
+        for part in parts:
+            ids.extend(self._fragment_ids(part))
+        ids.extend(self._suffix_ids)
+        return ids
+
+    def encode(self, prompt: str) -> List[int]:
+        if self.enabled and isinstance(prompt, AssembledPrompt):
+            ids = self._assemble(prompt)
+            if ids is not None:
+                return ids
+        self.fallbacks += 1
+        return self.tokenizer(prompt)["input_ids"]
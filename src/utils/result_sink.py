@@ -0,0 +1,256 @@
+"""
+Result sinks: where run_rrr_eval / run_rollouts put finished records.
+
+`write(rec)` only enqueues; serialization and file I/O happen on a background
+thread. The queue is bounded (`max_pending`), so a slow disk applies
+backpressure instead of growing memory. Errors on the writer thread are
+re-raised by the next `write` or by `close`.
+
+The format follows the output path:
+  *.jsonl    one JSON record per line, fsynced every `fsync_every` records
+  *.parquet  a directory of part files (part-00000.parquet, ...), each holding
+             up to `part_size` records (open_sink: `fsync_every`) with nested fields flattened to dotted
+             columns ("first.correct_loose", "first.meta.latency_s"). Parts are
+             written to a temp name and renamed, so a crash loses at most the
+             unwritten part. Needs pyarrow.
+
+`read_results(path, columns)` loads either format into a DataFrame, reading
+only the requested columns from Parquet.
+"""
+import glob
+import json
+import os
+import queue
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.utils.resume import fsync_file
+
+PARQUET_SUFFIX = ".parquet"
+_STOP = object()
+
+
+def is_parquet(path: str) -> bool:
+    return path.endswith(PARQUET_SUFFIX)
+
+
+def flatten(rec: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Nested dicts -> one level with dotted keys; lists and scalars are kept as values."""
+    out = {}
+    for key, value in rec.items():
+        name = prefix + key
+        if isinstance(value, dict) and value:
+            out.update(flatten(value, name + "."))
+        else:
+            out[name] = value
+    return out
+
+
+def unflatten(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of `flatten` for rows read back from Parquet; all-null sub-records become None."""
+    out: Dict[str, Any] = {}
+    for key in sorted(row, key=lambda k: k.count(".")):
+        value = row[key]
+        *parents, leaf = key.split(".")
+        node = out
+        for p in parents:
+            if not isinstance(node.get(p), dict):
+                node[p] = {}
+            node = node[p]
+        if isinstance(node.get(leaf), dict):
+            continue  # a null placeholder column for a field other rows have as a record
+        node[leaf] = value
+
+    def collapse(node):
+        if not isinstance(node, dict):
+            return node
+        node = {k: collapse(v) for k, v in node.items()}
+        return None if node and all(v is None for v in node.values()) else node
+    return {k: collapse(v) for k, v in out.items()}
+
+
+def _parquet_parts(path: str) -> List[str]:
+    return sorted(glob.glob(os.path.join(path, "part-*.parquet")))
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Parquet results need pyarrow: pip install pyarrow") from e
+    return pa, pq
+
+
+class _BackgroundSink:
+    def __init__(self, max_pending: int = 1024):
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._loop, name=f"{type(self).__name__}-writer", daemon=True)
+        self._thread.start()
+
+    def _raise_pending_error(self):
+        if self._error is not None:
+            err, self._error = self._error, None
+            raise RuntimeError(f"{type(self).__name__} writer failed") from err
+
+    def write(self, rec: dict):
+        self._raise_pending_error()
+        self._queue.put(rec)
+
+    def _loop(self):
+        stop = False
+        while not stop:
+            recs = [self._queue.get()]
+            while True:
+                try:
+                    recs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if recs[-1] is _STOP:
+                recs.pop()
+                stop = True
+            if self._error is not None:
+                continue  # keep draining so write() never blocks on a dead writer
+            try:
+                self._write_batch(recs)
+                if stop:
+                    self._finish()
+            except BaseException as e:
+                self._error = e
+
+    def close(self):
+        """Waits for every queued record to be written and durable."""
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._raise_pending_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write_batch(self, recs: List[dict]):
+        raise NotImplementedError
+
+    def _finish(self):
+        pass
+
+
+class JsonlSink(_BackgroundSink):
+    def __init__(self, path: str, append: bool = False, fsync_every: int = 50, max_pending: int = 1024):
+        self.path = path
+        self.fsync_every = fsync_every
+        self._f = open(path, "a" if append else "w", encoding="utf-8")
+        self._since_sync = 0
+        super().__init__(max_pending)
+
+    def _write_batch(self, recs: List[dict]):
+        self._f.write("".join(json.dumps(rec, ensure_ascii=False) + "\n" for rec in recs))
+        self._since_sync += len(recs)
+        if self._since_sync >= self.fsync_every:
+            fsync_file(self._f)
+            self._since_sync = 0
+
+    def _finish(self):
+        fsync_file(self._f)
+        self._f.close()
+
+
+class ParquetSink(_BackgroundSink):
+    def __init__(self, path: str, append: bool = False, part_size: int = 1000, max_pending: int = 1024):
+        self.pa, self.pq = _import_pyarrow()
+        self.path = path
+        self.part_size = part_size
+        os.makedirs(path, exist_ok=True)
+        parts = _parquet_parts(path)
+        if not append:
+            for part in parts:
+                os.remove(part)
+            parts = []
+        self._next_part = len(parts)
+        self._rows: List[dict] = []
+        super().__init__(max_pending)
+
+    def _write_batch(self, recs: List[dict]):
+        self._rows.extend(flatten(rec) for rec in recs)
+        while len(self._rows) >= self.part_size:
+            self._flush_part(self._rows[:self.part_size])
+            self._rows = self._rows[self.part_size:]
+
+    def _finish(self):
+        if self._rows:
+            self._flush_part(self._rows)
+            self._rows = []
+
+    def _flush_part(self, rows: List[dict]):
+        final = os.path.join(self.path, f"part-{self._next_part:05d}.parquet")
+        tmp = final + ".tmp"
+        # union of keys over all rows (Table.from_pylist would take the first row's)
+        names = list(dict.fromkeys(k for row in rows for k in row))
+        table = self.pa.table({k: [row.get(k) for row in rows] for k in names})
+        self.pq.write_table(table, tmp)
+        with open(tmp, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, final)
+        self._next_part += 1
+
+
+def open_sink(path: str, append: bool = False, fsync_every: int = 50, **kwargs):
+    """
+    JsonlSink or ParquetSink depending on `path` (see module docstring). A Parquet
+    part is durable once written, so `fsync_every` is its default `part_size`:
+    either way a crash loses fewer than `fsync_every` finished records.
+    """
+    if is_parquet(path):
+        kwargs.setdefault("part_size", fsync_every)
+        return ParquetSink(path, append=append, **kwargs)
+    return JsonlSink(path, append=append, fsync_every=fsync_every, **kwargs)
+
+
+def _read_parquet_table(path: str, columns: Optional[List[str]] = None):
+    pa, pq = _import_pyarrow()
+    tables = []
+    for part in _parquet_parts(path):
+        names = pq.ParquetFile(part).schema_arrow.names
+        cols = names if columns is None else [c for c in columns if c in names]
+        tables.append(pq.read_table(part, columns=cols))
+    if not tables:
+        return pa.table({c: [] for c in columns or []})
+    # parts may disagree on columns/types (e.g. a field that was all null in one part)
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+def read_records(path: str) -> List[dict]:
+    """All records of a result file, nested as they were written."""
+    if is_parquet(path):
+        if not os.path.isdir(path):
+            return []
+        return [unflatten(row) for row in _read_parquet_table(path).to_pylist()]
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def read_results(path: str, columns: Optional[Iterable[str]] = None):
+    """
+    A pandas DataFrame of flattened records, e.g.
+    read_results("results/runs/rrr_eval.parquet", ["first.correct_loose", "first.meta.latency_s"]).
+    Parquet reads only the requested columns; JSONL has to parse every line.
+    Requested columns no record has come back as all-None.
+    """
+    import pandas as pd
+
+    columns = list(columns) if columns is not None else None
+    if is_parquet(path):
+        df = _read_parquet_table(path, columns).to_pandas()
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            rows = [flatten(json.loads(line)) for line in f]
+        if columns is not None:
+            rows = [{c: row.get(c) for c in columns} for row in rows]
+        df = pd.DataFrame(rows)
+    if columns is not None:
+        df = df.reindex(columns=columns)
+    return df
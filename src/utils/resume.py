@@ -0,0 +1,51 @@
+import json
+import os
+from typing import List
+
+
+def load_done_records(path: str) -> List[dict]:
+    """
+    Reads the records an earlier (possibly crashed) run already wrote to `path`.
+
+    A torn final line -- the usual result of dying mid-write -- is dropped and
+    truncated away so the file can be appended to. A bad line anywhere else is
+    an error: that is not a crash artifact and resuming would hide it.
+    """
+    if not os.path.exists(path):
+        return []
+    if path.endswith(".parquet"):
+        # Parquet parts are renamed into place whole, so there is nothing torn to repair.
+        from src.utils.result_sink import read_records
+        return read_records(path)
+
+    records = []
+    good_end = 0
+    with open(path, "rb") as f:
+        lines = f.readlines()
+    for lineno, line in enumerate(lines, 1):
+        try:
+            if not line.endswith(b"\n"):
+                raise ValueError("missing newline")
+            rec = json.loads(line)
+        except ValueError:
+            if lineno == len(lines):
+                break
+            raise ValueError(f"{path}:{lineno}: unreadable record, refusing to resume")
+        records.append(rec)
+        good_end += len(line)
+
+    if good_end < os.path.getsize(path):
+        print(f"[resume] dropping torn final line of {path}", flush=True)
+        with open(path, "r+b") as f:
+            f.truncate(good_end)
+    return records
+
+
+def done_keys(records: List[dict]) -> set:
+    """Input line indices of finished records, falling back to the question text for records without one."""
+    return {rec["idx"] if "idx" in rec else rec["question"] for rec in records}
+
+
+def fsync_file(f):
+    f.flush()
+    os.fsync(f.fileno())
@@ -0,0 +1,49 @@
+"""
+Stop conditions carried by GenConfig, as plain string logic shared by the
+backends: HFGenerator checks them while decoding (hf_criteria.StopOnText),
+TinkerGenerator passes literal `stop` strings to the server and applies the
+rest to the returned text.
+"""
+import re
+from typing import Optional
+
+from src.utils.generator import GenConfig
+
+# A finished "#### <number>" line, in the shape extract_final_answer_strict accepts;
+# a "####" line with other text on it does not stop decoding.
+_FINAL_LINE_RE = re.compile(r"####\s*\$?\s*[-+]?\d+(?:\.\d+)?(?:/\d+(?:\.\d+)?)?[ \t]*\n")
+
+
+def has_stops(cfg: GenConfig) -> bool:
+    return bool(cfg.stop) or cfg.stop_after_final_answer or cfg.stop_after_newlines is not None
+
+
+def stop_index(text: str, cfg: GenConfig) -> Optional[int]:
+    """Offset at which `text` should be cut under `cfg`'s stop conditions; None if none fired."""
+    cuts = []
+    for s in cfg.stop:
+        i = text.find(s)
+        if i >= 0:
+            cuts.append(i)
+    if cfg.stop_after_final_answer:
+        m = _FINAL_LINE_RE.search(text)
+        if m:
+            cuts.append(m.end() - 1)
+    if cfg.stop_after_newlines is not None:
+        # counted from the first non-whitespace char: callers strip the text before taking lines
+        i = len(text) - len(text.lstrip()) - 1
+        for _ in range(cfg.stop_after_newlines):
+            i = text.find("\n", i + 1)
+            if i < 0:
+                break
+        if i >= 0:
+            cuts.append(i)
+    return min(cuts) if cuts else None
+
+
+def trigger_chars(cfg: GenConfig) -> str:
+    """Characters whose appearance in a new token can make `stop_index` fire."""
+    chars = {s[-1] for s in cfg.stop if s}
+    if cfg.stop_after_final_answer or cfg.stop_after_newlines is not None:
+        chars.add("\n")
+    return "".join(sorted(chars))
@@ -1,7 +1,19 @@
 import time
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, List, Tuple, Type
 
 from src.utils.generator import GenConfig
+from src.utils.inflight import InFlightSampler
+from src.utils.prompt_assembly import PromptAssembler
+from src.utils.stops import stop_index
+from src.utils.trace import span
+
+
+def _transient_errors(tinker) -> tuple:
+    # Network-level failures worth retrying; the SDK error classes are looked up
+    # defensively since their names are not part of a stable contract.
+    names = ("APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError")
+    sdk_errors = tuple(getattr(tinker, n) for n in names if isinstance(getattr(tinker, n, None), type))
+    return (ConnectionError, TimeoutError) + sdk_errors
 
 
 class TinkerGenerator:
@@ -12,8 +24,25 @@ class TinkerGenerator:
       - ServiceClient() -> create_lora_training_client(...)
       - training_client.save_weights_and_get_sampling_client(...)
       - sampling_client.sample(...)
+
+    `generate_batch` keeps up to `max_in_flight` sample requests outstanding
+    (see InFlightSampler) instead of waiting on each one in turn.
+
+    `from_clients` builds one around an existing sampling client, tokenizer and
+    types module instead, e.g. src/bench/fake_tinker.py's local fake
+    (scripts/check_tinker_generator.py).
     """
-    def __init__(self, base_model: str, rank: int = 8, sampler_name: str = "sampler"):
+    backend = "tinker"
+
+    def __init__(
+        self,
+        base_model: str,
+        rank: int = 8,
+        sampler_name: str = "sampler",
+        max_in_flight: int = 8,
+        max_retries: int = 3,
+        backoff_s: float = 1.0,
+    ):
         import os
         import tinker
         from tinker import types
@@ -23,10 +52,6 @@ class TinkerGenerator:
             raise RuntimeError("Missing TINKER_API_KEY in environment (.env or shell).")
 
         # ServiceClient reads TINKER_API_KEY from env.
-        self.tinker = tinker
-        self.types = types
-        self.base_model = base_model
-
         self.service = tinker.ServiceClient()
 
         # Create a LoRA training client (even for eval-only).
@@ -36,42 +61,124 @@ class TinkerGenerator:
             rank=rank,
         )
 
-        # Tokenizer for encode/decode
-        self.tokenizer = self.training_client.get_tokenizer()
-
         # Create a sampler checkpoint and get a SamplingClient.
-        self.sampling_client = self.training_client.save_weights_and_get_sampling_client(
+        sampling_client = self.training_client.save_weights_and_get_sampling_client(
             name=sampler_name
         )
 
-    def generate(self, prompt: str, cfg: GenConfig) -> Tuple[str, Dict[str, Any]]:
-        # Encode prompt into a ModelInput
-        prompt_tokens = self.tokenizer.encode(prompt, add_special_tokens=True)
+        self._setup(
+            sampling_client,
+            self.training_client.get_tokenizer(),
+            types,
+            base_model,
+            InFlightSampler(
+                max_in_flight=max_in_flight,
+                max_retries=max_retries,
+                backoff_s=backoff_s,
+                retry_on=_transient_errors(tinker),
+            ),
+        )
+
+    @classmethod
+    def from_clients(
+        cls,
+        sampling_client,
+        tokenizer,
+        types,
+        base_model: str = "local",
+        max_in_flight: int = 8,
+        max_retries: int = 3,
+        backoff_s: float = 1.0,
+        retry_on: Tuple[Type[BaseException], ...] = (ConnectionError, TimeoutError),
+    ) -> "TinkerGenerator":
+        """
+        No ServiceClient / API key: `sampling_client.sample(...)` must return a
+        future of a response with `.sequences`, and `types` must provide
+        ModelInput.from_ints and SamplingParams, as tinker.types does.
+        """
+        self = cls.__new__(cls)
+        self._setup(
+            sampling_client,
+            tokenizer,
+            types,
+            base_model,
+            InFlightSampler(max_in_flight=max_in_flight, max_retries=max_retries, backoff_s=backoff_s, retry_on=retry_on),
+        )
+        return self
+
+    def _setup(self, sampling_client, tokenizer, types, base_model: str, sampler: InFlightSampler):
+        self.sampling_client = sampling_client
+        self.tokenizer = tokenizer
+        self.assembler = PromptAssembler(tokenizer)
+        self.types = types
+        self.base_model = base_model
+        self.model_name = base_model
+        self.sampler = sampler
+
+    def _submit(self, prompt_tokens: List[int], cfg: GenConfig, num_samples: int = 1):
         model_input = self.types.ModelInput.from_ints(tokens=prompt_tokens)
 
-        params = self.tinker.SamplingParams(
+        params = self.types.SamplingParams(
             max_tokens=cfg.max_new_tokens,
             temperature=cfg.temperature,
             top_p=cfg.top_p,
-            # stop=["\n\n"]  # optional; you can add stops later
+            seed=cfg.seed,
+            # Only literal strings can stop server-side; the final-answer and newline
+            # rules are regex-like and get applied to the returned text in _sample.
+            stop=list(cfg.stop) or None,
         )
 
-        t0 = time.time()
-        # One sample
-        res = self.sampling_client.sample(
+        # Returns a future; the caller decides when to block.
+        return self.sampling_client.sample(
             prompt=model_input,
             sampling_params=params,
-            num_samples=1,
-        ).result()
-        dt = time.time() - t0
-
-        # Decode generated tokens
-        out_tokens = res.sequences[0].tokens
-        text = self.tokenizer.decode(out_tokens).strip()
-
-        meta = {
-            "backend": "tinker",
-            "model_name": self.base_model,
-            "latency_s": dt,
-        }
-        return text, meta
+            num_samples=num_samples,
+        )
+
+    def _sample(self, prompt: str, cfg: GenConfig, num_samples: int = 1) -> List[Tuple[str, Dict[str, Any]]]:
+        # Encode prompt (ModelInput is built from these ids in _submit)
+        with span("tinker.encode"):
+            prompt_tokens = self.assembler.encode(prompt)
+
+        t0 = time.perf_counter()
+        with span("tinker.sample", prompt_tokens=len(prompt_tokens), num_samples=num_samples):
+            res = self._submit(prompt_tokens, cfg, num_samples).result()
+        dt = time.perf_counter() - t0
+
+        results = []
+        for seq in res.sequences:
+            # Decode generated tokens
+            with span("tinker.decode"):
+                text = self.tokenizer.decode(seq.tokens)
+            cut = stop_index(text, cfg)
+            if cut is not None:
+                text = text[:cut]
+            text = text.strip()
+            # a sequence that ended before its budget on a configured stop string
+            # was cut by the server; tokens past a client-side cut were still decoded
+            server_stop = bool(cfg.stop) and getattr(seq, "stop_reason", None) == "stop"
+            meta = {
+                "backend": self.backend,
+                "model_name": self.base_model,
+                "latency_s": dt,
+                # the sampler returns whole sequences, so first-token time is not observable
+                "ttft_s": None,
+                "prompt_tokens": len(prompt_tokens),
+                "gen_tokens": len(seq.tokens),
+                "tokens_per_s": len(seq.tokens) / dt if dt > 0 else None,
+                "stopped_early": cut is not None or server_stop,
+                "tokens_saved": cfg.max_new_tokens - len(seq.tokens) if server_stop else 0,
+                "num_samples": num_samples,
+            }
+            results.append((text, meta))
+        return results
+
+    def generate(self, prompt: str, cfg: GenConfig) -> Tuple[str, Dict[str, Any]]:
+        return self.generate_batch([prompt], cfg)[0]
+
+    def generate_batch(self, prompts: List[str], cfg: GenConfig) -> List[Tuple[str, Dict[str, Any]]]:
+        return [res[0] for res in self.sampler.map(lambda p: self._sample(p, cfg), prompts)]
+
+    def generate_samples(self, prompt: str, cfg: GenConfig, num_samples: int) -> List[Tuple[str, Dict[str, Any]]]:
+        # A single request with num_samples > 1 shares the prompt prefill server-side.
+        return self.sampler.map(lambda p: self._sample(p, cfg, num_samples), [prompt])[0]
@@ -0,0 +1,93 @@
+"""
+Lightweight span tracing with Chrome trace / Perfetto JSON export.
+
+Off by default: `span()` then returns a shared no-op context manager, so an
+instrumented call site costs one global check. Enable with `enable()` (the
+scripts' --trace flag), wrap work in `with span("name", key=value): ...`, and
+write the collected events with `export(path)`; open the file in
+chrome://tracing or https://ui.perfetto.dev.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List
+
+_enabled = False
+_events: List[Dict[str, Any]] = []
+_lock = threading.Lock()
+_origin_ns = time.perf_counter_ns()
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "args", "t0")
+
+    def __init__(self, name: str, args: Dict[str, Any]):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        t1 = time.perf_counter_ns()
+        event = {
+            "name": self.name,
+            "ph": "X",
+            "ts": (self.t0 - _origin_ns) / 1000.0,  # microseconds
+            "dur": (t1 - self.t0) / 1000.0,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+        }
+        if self.args:
+            event["args"] = self.args
+        with _lock:
+            _events.append(event)
+        return False
+
+
+def span(name: str, **args):
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, args)
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def export(path: str):
+    """Writes the spans recorded so far as a Chrome trace JSON file."""
+    with _lock:
+        events = list(_events)
+
+    # name the threads so pool workers are distinguishable in the viewer
+    names = {t.ident: t.name for t in threading.enumerate()}
+    meta = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": names.get(tid, f"thread-{tid}")}}
+        for pid, tid in sorted({(e["pid"], e["tid"]) for e in events})
+    ]
+
+    out_dir = os.path.dirname(path)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": meta + events, "displayTimeUnit": "ms"}, f)
+    print(f"Wrote {len(events)} trace events to {path}")